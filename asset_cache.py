@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import re
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import metrics
+from keepalive_state import state_lock
+
+# 静态资源的本地磁盘缓存：通过路由拦截直接返回本地副本，未命中时从网络获取并写入
+ASSET_CACHE = os.getenv("ASSET_CACHE", "1") == "1"
+ASSET_CACHE_DIR = Path(os.getenv("ASSET_CACHE_DIR", ".asset_cache"))
+ASSET_CACHE_MAX_BYTES = int(os.getenv("ASSET_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# 超过该大小的单个资源不缓存
+MAX_ENTRY_BYTES = 20 * 1024 * 1024
+
+# 只拦截这些扩展名的GET请求，页面和接口请求不经过缓存
+ASSET_PATTERN = re.compile(r"^https?://[^?#]+\.(?:js|mjs|css|woff2?|ttf|otf|png|jpe?g|gif|svg|ico|webp|wasm)(?:[?#]|$)",
+                           re.IGNORECASE)
+# 内容已由body决定或不能原样回放的响应头
+DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie", "date", "age"}
+
+
+def _freshness(headers, now) -> float:
+    """
+    按响应头计算可直接使用的秒数；返回 None 表示不可缓存
+    这是单用户的私有缓存: private 的响应可以缓存，只对共享缓存生效的 s-maxage 不适用
+    """
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0
+    match = re.search(r"\bmax-age=(\d+)", cache_control)
+    if match:
+        return int(match.group(1)) - int(headers.get("age", "0") or 0)
+    try:
+        if "expires" in headers:
+            return parsedate_to_datetime(headers["expires"]).timestamp() - now
+        if "last-modified" in headers:
+            # 启发式新鲜度：距上次修改时间的10%（RFC 9111 4.2.2）
+            return (now - parsedate_to_datetime(headers["last-modified"]).timestamp()) / 10
+    except (TypeError, ValueError):
+        pass
+    return 0 if "etag" in headers else None
+
+
+class AssetCache:
+    """
+    内容寻址的资源缓存：blobs/<sha256> 保存内容，index.json 记录 URL -> 响应头、新鲜度和最近使用时间
+    相同内容的不同URL共享一份blob；总大小超过上限时按最近使用时间淘汰
+    多个进程可共用同一个缓存目录: 写回时在锁内重新读取索引，合并本进程的改动后再淘汰和写回
+    """
+
+    def __init__(self, root=ASSET_CACHE_DIR, max_bytes=ASSET_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.index_path = self.root / "index.json"
+        self.index = self._load_index()
+        # 本进程改动过的索引项: URL -> 索引项，None 表示blob已丢失需要删除
+        self.changes = {}
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"[资源缓存] 读取索引失败: {e}，从空缓存开始")
+            return {}
+
+    def _blob_path(self, digest) -> Path:
+        return self.root / "blobs" / digest[:2] / digest
+
+    def lookup(self, url):
+        """返回 (索引项, 内容)；未命中或blob丢失时返回 (None, None)"""
+        entry = self.index.get(url)
+        if not entry:
+            return None, None
+        try:
+            return entry, self._blob_path(entry["sha256"]).read_bytes()
+        except OSError:
+            del self.index[url]
+            self.changes[url] = None
+            return None, None
+
+    def is_fresh(self, entry, now) -> bool:
+        return now < entry["stored_at"] + entry["fresh_for"]
+
+    def store(self, url, status, headers, body, now) -> None:
+        fresh_for = _freshness(headers, now)
+        if fresh_for is None or status != 200 or len(body) > MAX_ENTRY_BYTES:
+            return
+        digest = hashlib.sha256(body).hexdigest()
+        blob = self._blob_path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob.with_name(blob.name + f".{os.getpid()}.tmp")
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, blob)
+        self.index[url] = {
+            "sha256": digest,
+            "size": len(body),
+            "status": status,
+            "headers": {name: value for name, value in headers.items() if name not in DROP_HEADERS},
+            "stored_at": now,
+            "fresh_for": max(fresh_for, 0),
+            "used_at": now,
+        }
+        self.changes[url] = self.index[url]
+
+    def touch(self, url, now, revalidated=False) -> None:
+        entry = self.index[url]
+        entry["used_at"] = now
+        if revalidated:
+            entry["stored_at"] = now
+        self.changes[url] = entry
+
+    def evict(self) -> None:
+        """按最近使用时间淘汰，直到blob总大小不超过上限"""
+        sizes = {}
+        for entry in self.index.values():
+            sizes[entry["sha256"]] = entry["size"]
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+        for url, entry in sorted(self.index.items(), key=lambda item: item[1]["used_at"]):
+            if total <= self.max_bytes:
+                break
+            del self.index[url]
+            digest = entry["sha256"]
+            if not any(other["sha256"] == digest for other in self.index.values()):
+                total -= entry["size"]
+                try:
+                    self._blob_path(digest).unlink()
+                except OSError:
+                    pass
+
+    def _merge(self) -> None:
+        """重新读取磁盘上的索引（其他进程可能已写回过），合并本进程的改动；同一URL保留最近使用的一项"""
+        self.index = self._load_index()
+        for url, entry in self.changes.items():
+            current = self.index.get(url)
+            if entry is None:
+                if current and not self._blob_path(current["sha256"]).exists():
+                    del self.index[url]
+            elif current is None or current["used_at"] <= entry["used_at"]:
+                self.index[url] = entry
+
+    def save(self) -> None:
+        """在锁内合并其他进程的索引，淘汰超出上限的内容并原子地写回索引"""
+        if not self.changes:
+            return
+        try:
+            # 合并、淘汰和写回必须在同一把锁内完成: 否则后写的进程会覆盖先写的索引，
+            # 淘汰时也可能删掉其他进程索引中仍在使用的blob
+            with state_lock("asset_cache"):
+                self._merge()
+                self.evict()
+                self.root.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.index_path.with_name(f"index.json.{os.getpid()}.tmp")
+                with open(tmp_path, 'w') as f:
+                    json.dump(self.index, f)
+                os.replace(tmp_path, self.index_path)
+            self.changes = {}
+        except Exception as e:
+            print(f"[资源缓存] 保存索引失败: {e}")
+
+    def handle(self, route, request) -> None:
+        """路由处理：新鲜则直接返回本地副本；过期则带校验头重新验证；未命中从网络获取并写入缓存"""
+        if request.method != "GET":
+            route.fallback()
+            return
+        url = request.url
+        now = time.time()
+        entry, body = self.lookup(url)
+        if entry and self.is_fresh(entry, now):
+            self._fulfill_cached(route, url, entry, body, now, "hit")
+            return
+
+        headers = dict(request.headers)
+        if entry:
+            if "etag" in entry["headers"]:
+                headers["if-none-match"] = entry["headers"]["etag"]
+            if "last-modified" in entry["headers"]:
+                headers["if-modified-since"] = entry["headers"]["last-modified"]
+        try:
+            response = route.fetch(headers=headers)
+        except Exception as e:
+            print(f"[资源缓存] 获取 {url} 失败: {e}")
+            route.fallback()
+            return
+
+        if entry and response.status == 304:
+            # 更新新鲜度（304中可能带有新的cache-control）
+            entry["fresh_for"] = max(_freshness({**entry["headers"], **response.headers}, now) or 0, 0)
+            self._fulfill_cached(route, url, entry, body, now, "revalidated", revalidated=True)
+            return
+
+        response_body = response.body()
+        metrics.inc("keepalive_asset_cache_requests_total", result="miss")
+        metrics.inc("keepalive_asset_cache_bytes_total", len(response_body), source="network")
+        self.store(url, response.status, response.headers, response_body, now)
+        route.fulfill(status=response.status,
+                      headers={name: value for name, value in response.headers.items() if name not in DROP_HEADERS},
+                      body=response_body)
+
+    def _fulfill_cached(self, route, url, entry, body, now, result, revalidated=False) -> None:
+        self.touch(url, now, revalidated=revalidated)
+        metrics.inc("keepalive_asset_cache_requests_total", result=result)
+        metrics.inc("keepalive_asset_cache_bytes_total", len(body), source="cache")
+        route.fulfill(status=entry["status"], headers=entry["headers"], body=body)
+
+
+def install_asset_cache(context):
+    """在浏览器上下文上启用资源缓存，上下文关闭时写回索引；返回缓存对象（未启用时为 None）"""
+    if not ASSET_CACHE:
+        return None
+    cache = AssetCache()
+    context.route(ASSET_PATTERN, cache.handle)
+    context.on("close", lambda _: cache.save())
+    print(f"[资源缓存] 已启用（{ASSET_CACHE_DIR}，{len(cache.index)} 项）")
+    return cache
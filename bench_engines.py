@@ -0,0 +1,113 @@
+"""
+浏览器引擎对比基准：在本地替身上运行 IDX 和 NVIDIA Air 的完整浏览器流程
+
+每个引擎、每个流程运行若干次（每次使用全新的替身、临时目录和状态），统计：
+  启动耗时    keepalive_browser_launch_seconds 指标
+  峰值内存    子进程树中最大单个进程的RSS（wait4返回的ru_maxrss）
+  端到端耗时  脚本从启动到退出的时间
+  成功次数    keepalive_success_total 指标
+
+页面请求经 STANDIN_HOSTS 转发到 idx_standin.py / nvair_standin.py，不访问真实网站。
+需要先安装对应引擎: python -m playwright install firefox chromium webkit
+
+用法: python bench_engines.py [运行次数] [引擎 ...]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import idx_standin
+import nvair_standin
+
+ENGINES = ("firefox", "chromium", "webkit")
+SIMULATION_ID = "0b5c6f7e-3d1a-4c2b-9e8f-1a2b3c4d5e6f"
+
+
+def prepare_idx(work_dir):
+    """启动IDX替身，返回 (server, 脚本, 环境变量)"""
+    server, base_url = idx_standin.start_standin(start_delay=5)
+    with open(os.path.join(work_dir, "google_cookies.json"), 'w') as f:
+        json.dump([{"name": "SID", "value": "standin", "domain": "idx.google.com", "path": "/"}], f)
+    env = {
+        "STANDIN_HOSTS": json.dumps({"idx.google.com": base_url}),
+        "GOOGLE_PW": "bench@example.com bench",
+        "APP_URL": "https://idx.google.com/app-bench",
+        "WEB_URL": f"{base_url}/_standin/app",
+        "IDX_HTTP_FASTPATH": "0",
+    }
+    return server, "main.py", env
+
+
+def prepare_nvair(work_dir):
+    """启动NVIDIA Air替身，返回 (server, 脚本, 环境变量)"""
+    server, api_base = nvair_standin.start_standin({SIMULATION_ID: 5}, step_hours=48)
+    with open(os.path.join(work_dir, "nvidia_cookies.json"), 'w') as f:
+        json.dump(nvair_standin.standin_cookies(domain="air.nvidia.com"), f)
+    env = {
+        "STANDIN_HOSTS": json.dumps({"air.nvidia.com": api_base[:-len("/api/v1")]}),
+        "NVPW": "bench@example.com bench",
+        "NVURL": f"https://air.nvidia.com/simulations/{SIMULATION_ID}",
+        "COOKIES_FILE": "nvidia_cookies.json",
+        "NV_API": "0",
+        "NV_ALL": "0",
+    }
+    return server, "main6.py", env
+
+
+FLOWS = {"idx": prepare_idx, "nvair": prepare_nvair}
+
+
+def read_metrics(state_dir):
+    try:
+        with open(os.path.join(state_dir, "metrics.json"), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def run_trial(flow, engine, script_dir):
+    """运行一次流程，返回 {wall, launch, rss_mb, success}"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        server, script, flow_env = FLOWS[flow](work_dir)
+        state_dir = os.path.join(work_dir, ".keepalive_state")
+        env = dict(os.environ, **flow_env, BROWSER_ENGINE=engine, KEEPALIVE_STATE_DIR=state_dir, TG="",
+                   ASSET_CACHE="0", KEEPALIVE_TRACE="off", HAR_MODE="", BROWSER_ENGINES="")
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(script_dir, script)], env=env, cwd=work_dir,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # wait4 返回该子进程（含其已回收的子孙进程）的资源使用，ru_maxrss 单位为KB
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        wall = time.perf_counter() - start
+        server.shutdown()
+
+        state = read_metrics(state_dir)
+    launches = state.get("histograms", {}).get("keepalive_browser_launch_seconds", {})
+    launch = sum(entry["sum"] for entry in launches.values()) / max(sum(entry["count"] for entry in launches.values()), 1)
+    successes = sum(state.get("counters", {}).get("keepalive_success_total", {}).values())
+    return {"wall": wall, "launch": launch, "rss_mb": usage.ru_maxrss / 1024, "success": successes > 0}
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    engines = sys.argv[2:] or list(ENGINES)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    print(f"每个组合运行 {runs} 次")
+    print(f"{'流程':<6} {'引擎':<9} {'启动(秒)':>9} {'峰值RSS(MB)':>12} {'端到端(秒)':>11} {'成功':>6}")
+    for flow in FLOWS:
+        for engine in engines:
+            trials = [run_trial(flow, engine, script_dir) for _ in range(runs)]
+            launch = statistics.median(t["launch"] for t in trials)
+            rss = max(t["rss_mb"] for t in trials)
+            wall = statistics.median(t["wall"] for t in trials)
+            succeeded = sum(t["success"] for t in trials)
+            print(f"{flow:<6} {engine:<9} {launch:>9.2f} {rss:>12.0f} {wall:>11.1f} {succeeded:>4}/{runs}")
+
+
+if __name__ == "__main__":
+    main()
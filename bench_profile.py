@@ -0,0 +1,114 @@
+"""
+渲染开销基准测试：比较 BROWSER_PROFILE=default 与 lite 的CPU时间和耗时
+
+在本地起一个模拟IDE负载的页面（大量CSS动画、过渡和 requestAnimationFrame 画布），
+每次在子进程中启动浏览器、打开页面、停留若干秒再关闭。
+CPU时间取子进程树（Python、Playwright驱动、浏览器各进程）的用户态+内核态时间之和。
+
+用法: python bench_profile.py [运行次数] [停留秒数]
+"""
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE = b"""<!doctype html>
+<html><head><style>
+  .box { width: 40px; height: 40px; margin: 4px; display: inline-block; background: #4a8;
+         animation: spin 1s linear infinite; transition: transform 0.3s; }
+  @keyframes spin { from { transform: rotate(0deg); } to { transform: rotate(360deg); } }
+</style></head>
+<body>
+  <canvas id="c" width="1600" height="400"></canvas>
+  <div id="boxes"></div>
+  <button>Add Time</button>
+  <script>
+    const boxes = document.getElementById('boxes');
+    for (let i = 0; i < 600; i++) { const d = document.createElement('div'); d.className = 'box'; boxes.appendChild(d); }
+    const ctx = document.getElementById('c').getContext('2d');
+    let t = 0;
+    (function frame() {
+      t += 1;
+      for (let i = 0; i < 200; i++) {
+        ctx.fillStyle = `hsl(${(t + i) % 360}, 60%, 50%)`;
+        ctx.fillRect((i * 8 + t) % 1600, (i * 3) % 400, 20, 20);
+      }
+      requestAnimationFrame(frame);
+    })();
+  </script>
+</body></html>
+"""
+
+# 子进程中执行的单次运行
+TRIAL = """
+import sys, time
+sys.path.insert(0, {script_dir!r})
+from playwright.sync_api import sync_playwright
+from browser_setup import launch_browser, new_context
+with sync_playwright() as playwright:
+    browser = launch_browser(playwright)
+    context = new_context(browser, "bench")
+    page = context.new_page()
+    page.goto({url!r})
+    page.get_by_text("Add Time").click()
+    time.sleep({hold})
+    context.close()
+    browser.close()
+"""
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_trial(profile, url, hold, script_dir):
+    """运行一次，返回 (耗时秒数, CPU秒数)"""
+    env = dict(os.environ, BROWSER_PROFILE=profile, ASSET_CACHE="0", HAR_MODE="")
+    code = TRIAL.format(script_dir=script_dir, url=url, hold=hold)
+    cpu_before = children_cpu()
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start, children_cpu() - cpu_before
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    hold = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    print(f"每个配置运行 {runs} 次，每次停留 {hold} 秒")
+    results = {}
+    for profile in ("default", "lite"):
+        trials = [run_trial(profile, url, hold, script_dir) for _ in range(runs)]
+        wall = statistics.median(t[0] for t in trials)
+        cpu = statistics.median(t[1] for t in trials)
+        results[profile] = cpu
+        print(f"{profile:<8} 耗时中位数 {wall:6.1f} 秒  CPU中位数 {cpu:6.1f} 秒")
+    if results["default"]:
+        print(f"lite 配置CPU时间为 default 的 {results['lite'] / results['default']:.0%}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+离线回放基准测试：用录制好的HAR多次运行保活脚本，统计耗时
+
+先用真实网站录制一次（会话结束时写入 hars/<名称>.har.zip，名称按目标区分，如 idx-app-43646734）:
+  HAR_MODE=record python main.py
+  HAR_MODE=record python main6.py
+再用录制时相同的 APP_URL/NVURL 等环境变量离线回放:
+  python bench_replay.py main.py [运行次数]
+  python bench_replay.py main6.py [运行次数]
+
+回放时关闭所有绕过浏览器的HTTP请求（健康检查、HTTP快速路径、Air接口），
+并去掉服务器启动后的固定等待（IDX_HOLD_SECONDS=0），耗时只反映页面流程本身。
+每次在临时目录中运行（复制录制时使用的cookies文件），避免熔断器、自适应退避、
+cookies刷新等跨运行状态影响结果。
+"""
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# 录制时脚本读取的cookies文件，回放时需要相同的登录状态才能走相同的路径
+COOKIES_FILES = ("google_cookies.json", "nvidia_cookies.json")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python bench_replay.py <main.py|main6.py> [运行次数]")
+        sys.exit(1)
+    script = sys.argv[1]
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    env = dict(os.environ)
+    env.update({
+        "HAR_MODE": "replay",
+        # 没有预览地址时不做HTTP检查，保持页面的固定等待也跳过
+        "WEB_URL": "", "WEB_URL2": "", "WEB_URL3": "", "WEB_URL4": "", "WEB_URL5": "",
+        "IDX_HOLD_SECONDS": "0",
+        "IDX_HTTP_FASTPATH": "0",
+        "NV_API": "0",
+        "TG": "",
+        "KEEPALIVE_TRACE": "off",
+    })
+    env.setdefault("GOOGLE_PW", "bench@example.com bench")
+    env.setdefault("HAR_DIR", os.path.join(script_dir, "hars"))
+
+    durations = []
+    for i in range(runs):
+        with tempfile.TemporaryDirectory() as state_dir:
+            env["KEEPALIVE_STATE_DIR"] = os.path.join(state_dir, ".keepalive_state")
+            for cookies_file in COOKIES_FILES:
+                if os.path.exists(os.path.join(script_dir, cookies_file)):
+                    shutil.copy(os.path.join(script_dir, cookies_file), state_dir)
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, os.path.join(script_dir, script)], env=env, cwd=state_dir,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, check=False)
+            duration = time.perf_counter() - start
+        durations.append(duration)
+        last_line = completed.stdout.strip().splitlines()[-1] if completed.stdout.strip() else ""
+        print(f"第 {i + 1} 次: {duration:6.1f} 秒  退出码 {completed.returncode}  {last_line}")
+
+    print(f"{script} 回放 {runs} 次: 最小 {min(durations):.1f} 秒  中位数 {statistics.median(durations):.1f} 秒"
+          f"  最大 {max(durations):.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
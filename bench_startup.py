@@ -0,0 +1,64 @@
+"""
+启动耗时基准测试：目标健康时脚本从启动到退出需要多久
+
+在本地起一个总是返回200的HTTP服务作为WEB_URL，多次运行 main.py 统计耗时，
+并与单独导入 Playwright / requests 的耗时对比。
+
+用法: python bench_startup.py [运行次数]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class HealthyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def time_command(args, env, runs):
+    """运行命令若干次，返回每次的耗时（毫秒）"""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def report(name, durations):
+    print(f"{name:<32} 最小 {min(durations):7.1f} ms  中位数 {statistics.median(durations):7.1f} ms")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HealthyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    web_url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    env = dict(os.environ)
+    env.update({"GOOGLE_PW": "bench@example.com bench", "WEB_URL": web_url})
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    print(f"运行 {runs} 次，WEB_URL={web_url}")
+    report("python -c pass", time_command([sys.executable, "-c", "pass"], env, runs))
+    report("main.py (目标健康，快速退出)", time_command([sys.executable, os.path.join(script_dir, "main.py")], env, runs))
+    for module in ("requests", "playwright.sync_api"):
+        durations = time_command([sys.executable, "-c", f"import {module}"], env, runs)
+        report(f"import {module}", durations)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import metrics
+
+# record: 把整次会话录制为HAR; replay: 完全从HAR回放，不访问真实网站（用于离线基准和回归测试）
+HAR_MODE = os.getenv("HAR_MODE", "")
+HAR_DIR = Path(os.getenv("HAR_DIR", "hars"))
+# 回放时HAR中没有的请求: abort 直接失败（结果可复现），fallback 继续访问网络
+HAR_NOT_FOUND = os.getenv("HAR_NOT_FOUND", "abort")
+
+# 浏览器引擎: BROWSER_ENGINE 为默认引擎，BROWSER_ENGINES 可按目标主机名单独指定
+# 例如 BROWSER_ENGINES='{"idx.google.com": "chromium", "air.nvidia.com": "firefox"}'
+ENGINES = ("firefox", "chromium", "webkit")
+BROWSER_ENGINE = os.getenv("BROWSER_ENGINE", "firefox")
+
+# 把真实站点的请求转发到本地替身（基准测试和回归测试用），格式同上: {"主机名": "替身地址"}
+STANDIN_HOSTS_ENV = "STANDIN_HOSTS"
+
+# 浏览器配置: default 与Playwright默认一致; lite 降低渲染开销（小视口、减少动效、禁用动画、静音、降低帧率）
+BROWSER_PROFILE = os.getenv("BROWSER_PROFILE", "default")
+
+LITE_VIEWPORT = {"width": 1024, "height": 640}
+# 在每个页面和iframe中注入，关闭CSS动画和过渡
+DISABLE_ANIMATIONS_JS = """
+(() => {
+  const css = '*, *::before, *::after { animation: none !important; transition: none !important; ' +
+              'scroll-behavior: auto !important; caret-color: transparent !important; }';
+  const inject = () => {
+    const style = document.createElement('style');
+    style.textContent = css;
+    (document.head || document.documentElement).appendChild(style);
+  };
+  if (document.documentElement) inject(); else document.addEventListener('DOMContentLoaded', inject);
+  // 媒体一律静音播放
+  const play = HTMLMediaElement.prototype.play;
+  HTMLMediaElement.prototype.play = function () { this.muted = true; return play.call(this); };
+})();
+"""
+# 降低渲染开销的Firefox首选项
+LITE_FIREFOX_PREFS = {
+    "layout.frame_rate": 10,                 # 限制刷新率，页面动画和重绘按10fps进行
+    "ui.prefersReducedMotion": 1,
+    "image.animation_mode": "none",          # GIF/APNG只显示第一帧
+    "media.autoplay.default": 5,             # 禁止一切自动播放
+    "media.volume_scale": "0.0",
+    "toolkit.cosmeticAnimations.enabled": False,
+}
+# Chromium没有对应的首选项，用启动参数实现同样的效果
+LITE_CHROMIUM_ARGS = [
+    "--force-prefers-reduced-motion",
+    "--mute-audio",
+    "--autoplay-policy=user-gesture-required",
+    "--disable-smooth-scrolling",
+]
+
+
+def _host_map(env_name) -> dict:
+    """解析 {"主机名": 值} 形式的JSON环境变量"""
+    value = os.getenv(env_name, "")
+    if not value:
+        return {}
+    try:
+        return dict(json.loads(value))
+    except (ValueError, TypeError) as e:
+        print(f"解析 {env_name} 失败: {e}，忽略")
+        return {}
+
+
+def engine_for(target=None) -> str:
+    """目标使用的浏览器引擎: BROWSER_ENGINES 中按主机名指定的优先，否则用 BROWSER_ENGINE"""
+    host = urlsplit(target).hostname if target else None
+    engine = _host_map("BROWSER_ENGINES").get(host) or BROWSER_ENGINE
+    if engine not in ENGINES:
+        print(f"不支持的浏览器引擎 {engine}，使用 firefox")
+        engine = "firefox"
+    return engine
+
+
+def launch_options(engine="firefox") -> dict:
+    """按 BROWSER_PROFILE 返回该引擎 launch() 的参数"""
+    if BROWSER_PROFILE != "lite":
+        return {}
+    if engine == "firefox":
+        return {"firefox_user_prefs": dict(LITE_FIREFOX_PREFS)}
+    if engine == "chromium":
+        return {"args": list(LITE_CHROMIUM_ARGS)}
+    return {}
+
+
+def launch_browser(playwright, target=None, headless=True):
+    """按目标选择引擎并启动浏览器（应用当前配置的首选项），同时记录启动耗时"""
+    engine = engine_for(target)
+    print(f"启动浏览器: {engine}")
+    started = time.monotonic()
+    browser = getattr(playwright, engine).launch(headless=headless, **launch_options(engine))
+    # 只统计成功的启动
+    metrics.observe("keepalive_browser_launch_seconds", time.monotonic() - started, engine=engine)
+    return browser
+
+
+def context_options() -> dict:
+    """按 BROWSER_PROFILE 返回 browser.new_context() 的参数"""
+    if BROWSER_PROFILE == "lite":
+        return {"viewport": dict(LITE_VIEWPORT), "reduced_motion": "reduce", "device_scale_factor": 1}
+    return {}
+
+
+def har_name(prefix, url) -> str:
+    """按目标区分HAR名称（如 idx-app-43646734），多个脚本、多个工作区录制时互不覆盖"""
+    label = re.sub(r"[^A-Za-z0-9._-]+", "_", urlsplit(url).path).strip("_")
+    return f"{prefix}-{label}" if label else prefix
+
+
+def har_path(name) -> Path:
+    """会话对应的HAR文件，HAR_PATH 可指定具体文件（.zip 时资源以附件形式存放，体积更小）"""
+    if os.getenv("HAR_PATH"):
+        return Path(os.environ["HAR_PATH"])
+    return HAR_DIR / f"{name}.har.zip"
+
+
+def route_to_standins(context, hosts) -> None:
+    """把发往 hosts 中主机的请求（含iframe和XHR）转发到对应的本地替身，保留原始请求头和cookies"""
+    def forward(route, request):
+        parts = urlsplit(request.url)
+        url = hosts[parts.hostname].rstrip("/") + parts.path + (f"?{parts.query}" if parts.query else "")
+        try:
+            response = route.fetch(url=url, headers=request.all_headers())
+        except Exception as e:
+            print(f"[替身] 转发 {request.url} 失败: {e}")
+            route.abort()
+            return
+        route.fulfill(response=response)
+
+    context.route(lambda url: urlsplit(url).hostname in hosts, forward)
+    print(f"[替身] 转发到本地替身: {hosts}")
+
+
+def new_context(browser, name, **options):
+    """创建浏览器上下文；按 HAR_MODE 录制或回放整个会话，name 用于区分不同脚本的HAR"""
+    path = har_path(name)
+    options = {**context_options(), **options}
+    if HAR_MODE == "record":
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # HAR在 context.close() 时写入
+        options.update(record_har_path=str(path), record_har_mode="full")
+        print(f"[HAR] 录制会话到 {path}")
+    context = browser.new_context(**options)
+    if BROWSER_PROFILE == "lite":
+        context.add_init_script(DISABLE_ANIMATIONS_JS)
+    if HAR_MODE == "replay":
+        if not path.exists():
+            context.close()
+            raise FileNotFoundError(f"[HAR] 回放文件 {path} 不存在，请先用 HAR_MODE=record 录制")
+        context.route_from_har(str(path), not_found=HAR_NOT_FOUND)
+        print(f"[HAR] 从 {path} 回放会话（未录制的请求: {HAR_NOT_FOUND}）")
+        return context
+    standin_hosts = _host_map(STANDIN_HOSTS_ENV)
+    if standin_hosts:
+        route_to_standins(context, standin_hosts)
+    elif HAR_MODE != "record":
+        # 录制、回放和使用替身时不使用资源缓存，保证请求与真实网络一致
+        from asset_cache import install_asset_cache
+        install_asset_cache(context)
+    return context
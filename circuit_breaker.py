@@ -0,0 +1,81 @@
+import os
+import socket
+import time
+
+from keepalive_state import load_state, save_state, state_lock
+
+CIRCUIT_FILE = "circuit_breaker.json"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# 连续失败多少次后断开
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+# 断开后的冷却时间（秒），每次重新断开翻倍，最长不超过 MAX_COOLDOWN
+BASE_COOLDOWN = int(os.getenv("CIRCUIT_COOLDOWN", "3600"))
+MAX_COOLDOWN = int(os.getenv("CIRCUIT_MAX_COOLDOWN", "86400"))
+# 半开探测的占用时间（秒）: 期间其他运行器不再探测；探测进程崩溃没有记录结果时，过期后允许重新探测
+PROBE_LEASE = int(os.getenv("CIRCUIT_PROBE_LEASE", "600"))
+
+
+def _load(target):
+    circuits = load_state(CIRCUIT_FILE, {})
+    return circuits, circuits.get(target, {"state": CLOSED, "failures": 0, "opens": 0, "opened_at": 0})
+
+
+def check_circuit(target):
+    """
+    判断本次是否应该处理该目标，返回 (是否允许, 熔断状态)
+    断开状态下冷却时间未到则跳过；冷却结束后进入半开状态，只允许一次低成本的探测
+    """
+    with state_lock("circuit_breaker"):
+        circuits, entry = _load(target)
+        if entry["state"] == CLOSED:
+            return True, CLOSED
+
+        cooldown = min(BASE_COOLDOWN * 2 ** max(entry["opens"] - 1, 0), MAX_COOLDOWN)
+        waited = time.time() - entry["opened_at"]
+        if entry["state"] == OPEN and waited < cooldown:
+            print(f"熔断器断开中（连续失败 {entry['failures']} 次），{int(cooldown - waited)} 秒后再探测，本次跳过")
+            return False, OPEN
+
+        # 并发的运行器（工作队列、多进程协调器）中只有第一个拿到探测权
+        if entry["state"] == HALF_OPEN and time.time() - entry.get("probe_started", 0) < PROBE_LEASE:
+            print(f"熔断器半开，{entry.get('probe_owner')} 正在探测，本次跳过")
+            return False, HALF_OPEN
+
+        entry["state"] = HALF_OPEN
+        entry["probe_started"] = time.time()
+        entry["probe_owner"] = f"{socket.gethostname()}-{os.getpid()}"
+        circuits[target] = entry
+        save_state(CIRCUIT_FILE, circuits)
+    print("熔断器冷却结束，进入半开状态，本次只做一次低成本探测")
+    return True, HALF_OPEN
+
+
+def record_success(target) -> None:
+    """目标处理成功，闭合熔断器"""
+    with state_lock("circuit_breaker"):
+        circuits, entry = _load(target)
+        if entry["state"] != CLOSED:
+            print("目标已恢复，熔断器闭合")
+        circuits[target] = {"state": CLOSED, "failures": 0, "opens": 0, "opened_at": 0}
+        save_state(CIRCUIT_FILE, circuits)
+
+
+def record_failure(target) -> None:
+    """目标处理失败；连续失败达到阈值或半开探测失败时断开熔断器"""
+    with state_lock("circuit_breaker"):
+        circuits, entry = _load(target)
+        entry["failures"] += 1
+        entry.pop("probe_started", None)
+        entry.pop("probe_owner", None)
+        if entry["state"] == HALF_OPEN or entry["failures"] >= FAILURE_THRESHOLD:
+            entry["state"] = OPEN
+            entry["opens"] += 1
+            entry["opened_at"] = time.time()
+            cooldown = min(BASE_COOLDOWN * 2 ** (entry["opens"] - 1), MAX_COOLDOWN)
+            print(f"目标连续失败 {entry['failures']} 次，熔断器断开，{cooldown} 秒内不再处理")
+        circuits[target] = entry
+        save_state(CIRCUIT_FILE, circuits)
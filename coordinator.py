@@ -0,0 +1,149 @@
+"""
+多进程协调器：启动若干工作进程，每个进程拥有自己的 Playwright 和浏览器，把目标分发给它们并汇总结果
+
+Playwright 同步接口的客户端部分只能占用一个CPU核，单进程驱动很多页面时会卡在这里；
+每个工作进程独立驱动一个浏览器，目标多时可以用满所有核。
+  - 任务队列有上限（默认为工作进程数），队列满时协调器阻塞，不会一次把所有目标塞进内存
+  - 工作进程在目标之间复用浏览器，每个目标仍使用全新的上下文；浏览器断开时重新启动
+  - 结果按完成顺序汇总，最后输出每个目标的结果和耗时
+
+NVIDIA Air 目标的配置在 main6.py 导入时读取，仍由工作进程以子进程执行。
+
+用法: python coordinator.py targets.txt [--workers N] [--queue-size M] [--index i --count n]
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import time
+
+from targets import load_targets
+
+WORKERS = int(os.getenv("COORDINATOR_WORKERS", str(os.cpu_count() or 1)))
+
+
+def worker_main(worker_id, jobs, results) -> None:
+    """工作进程：取目标执行，直到收到 None"""
+    from playwright.sync_api import sync_playwright
+    from browser_setup import engine_for, launch_browser
+    from targets import run_target
+
+    browsers = {}  # 引擎 -> 浏览器，不同目标可能使用不同引擎
+    with sync_playwright() as playwright:
+        try:
+            while True:
+                target = jobs.get()
+                if target is None:
+                    break
+                started = time.monotonic()
+                browser = None
+                if target["kind"] == "idx":
+                    engine = engine_for(target["url"])
+                    browser = browsers.get(engine)
+                    if browser is None or not browser.is_connected():
+                        try:
+                            browser = browsers[engine] = launch_browser(playwright, target["url"])
+                        except Exception as e:
+                            # 交给 run() 自己启动
+                            print(f"[工作进程{worker_id}] 启动浏览器失败: {e}")
+                            browsers.pop(engine, None)
+                            browser = None
+                success = False
+                try:
+                    success = run_target(target, playwright, browser)
+                except Exception as e:
+                    print(f"[工作进程{worker_id}] 执行 {target['key']} 时发生错误: {e}")
+                results.put((worker_id, target["key"], success, time.monotonic() - started))
+        finally:
+            for browser in browsers.values():
+                try:
+                    browser.close()
+                except Exception as e:
+                    print(f"[工作进程{worker_id}] 关闭浏览器失败: {e}")
+
+
+def coordinate(targets, workers=WORKERS, queue_size=None) -> list:
+    """把目标分发给工作进程执行，返回 [(目标key, 是否成功, 耗时, 工作进程序号)]"""
+    workers = max(1, min(workers, len(targets)))
+    # spawn: 工作进程从干净的解释器启动，不继承协调器的线程和打开的连接
+    mp = multiprocessing.get_context("spawn")
+    jobs = mp.Queue(maxsize=queue_size or workers)
+    results = mp.Queue()
+    processes = [mp.Process(target=worker_main, args=(i, jobs, results), daemon=True) for i in range(workers)]
+    for process in processes:
+        process.start()
+    print(f"[协调器] {workers} 个工作进程处理 {len(targets)} 个目标")
+
+    collected = []
+
+    def drain(block):
+        while len(collected) < len(targets):
+            try:
+                worker_id, key, success, seconds = results.get(timeout=5) if block else results.get_nowait()
+            except queue.Empty:
+                return
+            collected.append((key, success, seconds, worker_id))
+            print(f"[协调器] ({len(collected)}/{len(targets)}) 工作进程{worker_id} {key} "
+                  f"{'成功' if success else '失败'}，耗时 {seconds:.0f} 秒")
+
+    def put(item):
+        """队列满时阻塞等待工作进程取走任务（背压），等待期间顺便收集结果；工作进程全部退出时返回False"""
+        while True:
+            try:
+                jobs.put(item, timeout=1)
+                return True
+            except queue.Full:
+                drain(block=False)
+                if not any(process.is_alive() for process in processes):
+                    return False
+
+    for target in targets:
+        if not put(target):
+            raise RuntimeError("所有工作进程都已退出")
+        drain(block=False)
+    # 每个仍在运行的工作进程一个结束标记
+    for process in processes:
+        if process.is_alive() and not put(None):
+            break
+
+    while len(collected) < len(targets) and any(process.is_alive() for process in processes):
+        drain(block=True)
+    drain(block=False)
+    for process in processes:
+        process.join()
+    return collected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程执行目标列表")
+    parser.add_argument("targets", help="目标列表文件，格式见 targets.py")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="工作进程数，默认为CPU核数")
+    parser.add_argument("--queue-size", type=int, help="任务队列上限，默认等于工作进程数")
+    parser.add_argument("--index", type=int, help="只处理一致性哈希分片中的目标（见 shard.py）")
+    parser.add_argument("--count", type=int, help="分片总数")
+    args = parser.parse_args()
+    if args.count is not None or args.index is not None:
+        if args.count is None or args.index is None or not 0 <= args.index < args.count:
+            parser.error("--index 和 --count 需同时指定，且 --index 必须在 0 到 count-1 之间")
+
+    targets = load_targets(args.targets)
+    if args.count:
+        from shard import build_ring, owner
+        ring = build_ring(args.count)
+        targets = [target for target in targets if owner(ring, target["key"]) == args.index]
+    if not targets:
+        print("没有需要处理的目标")
+        return
+
+    started = time.monotonic()
+    collected = coordinate(targets, args.workers, args.queue_size)
+    finished = {key for key, *_ in collected}
+    succeeded = sum(1 for _, success, *_ in collected if success)
+    print(f"\n完成 {succeeded}/{len(targets)} 个目标，总耗时 {time.monotonic() - started:.0f} 秒")
+    for target in targets:
+        if target["key"] not in finished:
+            print(f"  未完成（工作进程异常退出）: {target['key']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import time
+
+
+class Deadline:
+    """
+    整次运行的截止时间（本地单调时钟），并按阶段分配时间预算
+    每个阶段开始时，从剩余时间中按该阶段及之后各阶段的名义预算比例分得自己的份额，
+    因此前面的阶段超时后，后面阶段的预算会相应缩小，整次运行不会超过总预算
+    """
+
+    def __init__(self, total_seconds, phases):
+        # phases: [(阶段名, 名义预算秒数), ...]，按执行顺序排列
+        self.total_seconds = total_seconds
+        self.phases = list(phases)
+        self.started = time.monotonic()
+        self.ends = self.started + total_seconds
+        self.phase = None
+        self.phase_ends = self.ends
+        self.phase_started = self.started
+        # 已结束阶段的实际耗时 [(阶段名, 秒数), ...]
+        self.durations = []
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        return max(0.0, self.ends - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def phase_budget(self, name) -> float:
+        """计算某阶段此刻能分到的预算（秒），不超过它的名义预算"""
+        names = [phase for phase, _ in self.phases]
+        if name not in names:
+            return self.remaining()
+        pending = self.phases[names.index(name):]
+        nominal = dict(self.phases)[name]
+        weight = sum(seconds for _, seconds in pending) or 1
+        return min(nominal, self.remaining() * nominal / weight)
+
+    def start_phase(self, name, cap=None) -> float:
+        """进入新阶段，返回该阶段的预算（秒）；cap可进一步限制预算（如自适应刷新预算）"""
+        budget = self.phase_budget(name)
+        if cap is not None:
+            budget = min(budget, cap)
+        now = time.monotonic()
+        if self.phase is not None:
+            self.durations.append((self.phase, now - self.phase_started))
+        self.phase_started = now
+        self.phase = name
+        self.phase_ends = min(self.ends, time.monotonic() + budget)
+        print(f"[预算] 阶段 {name}: {int(budget)} 秒（总剩余 {int(self.remaining())} 秒）")
+        return budget
+
+    def phase_durations(self) -> list:
+        """各阶段的实际耗时，包括当前仍在进行的阶段"""
+        if self.phase is None:
+            return list(self.durations)
+        return self.durations + [(self.phase, time.monotonic() - self.phase_started)]
+
+    def phase_remaining(self) -> float:
+        return max(0.0, min(self.phase_ends, self.ends) - time.monotonic())
+
+    def phase_expired(self) -> bool:
+        return self.phase_remaining() <= 0
+
+    def timeout_ms(self, cap_ms=None) -> int:
+        """供Playwright使用的超时（毫秒）：不超过cap_ms，也不超过当前阶段剩余时间"""
+        remaining_ms = int(self.phase_remaining() * 1000)
+        if cap_ms is not None:
+            remaining_ms = min(cap_ms, remaining_ms)
+        # Playwright中timeout=0表示不限时，因此至少保留1毫秒
+        return max(1, remaining_ms)
+
+
+def bounded_ms(deadline, cap_ms) -> int:
+    """没有截止时间对象时直接返回cap_ms，否则再受当前阶段剩余时间限制"""
+    if deadline is None:
+        return cap_ms
+    return deadline.timeout_ms(cap_ms)
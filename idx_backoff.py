@@ -0,0 +1,92 @@
+import math
+import time
+
+from keepalive_state import load_state, save_state, state_lock
+
+COLDSTART_FILE = "idx_coldstart.json"
+
+# 每个工作区最多保留的冷启动样本数
+MAX_SAMPLES = 20
+# 没有历史数据时，第一次刷新前的默认等待时间（秒）
+DEFAULT_PRIOR = 30
+# 两次刷新之间的最小/最大间隔（秒）
+MIN_INTERVAL = 15
+MAX_INTERVAL = 90
+# 总等待预算的下限（秒）
+MIN_BUDGET = 45
+BACKOFF_FACTOR = 2
+
+
+def _percentile(values, q):
+    """计算百分位数（线性插值）"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    pos = (len(ordered) - 1) * q
+    lower = math.floor(pos)
+    upper = math.ceil(pos)
+    if lower == upper:
+        return ordered[lower]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+def _load_entry(app_url):
+    history = load_state(COLDSTART_FILE, {})
+    return history, history.get(app_url, {"samples": [], "failures": 0})
+
+
+def record_cold_start(app_url, seconds) -> None:
+    """记录一次成功的冷启动耗时，并清零连续失败次数"""
+    with state_lock("idx_coldstart"):
+        history, entry = _load_entry(app_url)
+        samples = entry.get("samples", []) + [round(seconds, 1)]
+        history[app_url] = {
+            "samples": samples[-MAX_SAMPLES:],
+            "failures": 0,
+            "updated": int(time.time()),
+        }
+        save_state(COLDSTART_FILE, history)
+
+
+def record_cold_start_failure(app_url) -> None:
+    """记录一次在预算内未能启动的情况"""
+    with state_lock("idx_coldstart"):
+        history, entry = _load_entry(app_url)
+        history[app_url] = {
+            "samples": entry.get("samples", []),
+            "failures": entry.get("failures", 0) + 1,
+            "updated": int(time.time()),
+        }
+        save_state(COLDSTART_FILE, history)
+
+
+def plan_refresh_schedule(app_url, refresh_attempts=5, total_wait_time=120):
+    """
+    根据该工作区历史冷启动耗时规划刷新间隔和总等待预算
+    返回 (刷新间隔列表, 总预算秒数)
+    - 第一次刷新前等待约为历史中位数，避免打断快要启动完成的服务器
+    - 之后按指数退避拉长间隔
+    - 总预算取历史 p90 的 1.5 倍，连续失败的工作区会缩短预算
+    """
+    _, entry = _load_entry(app_url)
+    samples = entry.get("samples", [])
+    failures = entry.get("failures", 0)
+
+    if samples:
+        prior = _percentile(samples, 0.5)
+        budget = _percentile(samples, 0.9) * 1.5
+        budget = min(max(budget, MIN_BUDGET), total_wait_time * 2)
+    else:
+        prior = DEFAULT_PRIOR
+        budget = total_wait_time
+
+    # 连续失败说明工作区很可能卡住了，没必要每次都等满
+    if failures:
+        budget = max(MIN_BUDGET, budget / (1 + failures))
+
+    prior = min(max(prior, MIN_INTERVAL), MAX_INTERVAL)
+    intervals = [
+        min(prior * BACKOFF_FACTOR ** i, MAX_INTERVAL)
+        for i in range(refresh_attempts)
+    ]
+    return intervals, int(budget)
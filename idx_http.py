@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+from keepalive_state import load_state, save_state, state_lock
+
+# 与Playwright中Firefox大致一致的UA，避免被当成脚本请求而返回不同页面
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0"
+
+# 浏览器流程中观察到的、触发工作区启动的请求，按 APP_URL 保存，供快速路径重放
+START_REQUESTS_FILE = "idx_start_requests.json"
+# 视为"启动工作区"的请求: 非GET、URL匹配该正则、且返回成功
+START_REQUEST_PATTERN = re.compile(os.getenv("IDX_START_REQUEST_PATTERN", r"(?i)[:/]start(workstation|workspace)?\b"))
+MAX_START_REQUESTS = 3
+# 重放时不带的请求头: cookies由会话提供，其余由requests重新生成
+SKIP_HEADERS = {"cookie", "content-length", "host", "connection", "accept-encoding"}
+# Authorization 中各哈希对应的cookie
+SAPISID_HASHES = {"SAPISIDHASH": "SAPISID", "SAPISID1PHASH": "__Secure-1PAPISID", "SAPISID3PHASH": "__Secure-3PAPISID"}
+
+# cookies文件 -> 会话；同一进程处理多个账号时（工作队列、多进程协调器）各账号的cookies互不混用
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(cookies_path=None):
+    """返回该cookies文件对应的复用会话（带连接池），不传时返回不带账号的会话"""
+    key = str(Path(cookies_path).resolve()) if cookies_path else None
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _sessions[key] = session
+    return session
+
+
+def load_cookies_into_session(session, cookies_path) -> bool:
+    """把Playwright格式的cookies文件加载到requests会话中（替换会话中原有的cookies）"""
+    try:
+        with open(cookies_path, 'r') as f:
+            cookies = json.load(f)
+        # 文件可能已被重新登录刷新，旧的cookies不能留在会话里
+        session.cookies.clear()
+        for cookie in cookies:
+            session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain", ""),
+                path=cookie.get("path", "/"),
+            )
+        return True
+    except Exception as e:
+        print(f"加载 cookies 到HTTP会话失败: {e}")
+        return False
+
+
+def check_http_ok(url, timeout_seconds=10) -> bool:
+    """只用标准库检查URL是否返回200（跟随重定向），用于无需导入requests的快速退出"""
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout_seconds) as response:
+            return response.status == 200
+    except Exception as e:
+        print(f"检查 {url} 状态失败: {e}")
+        return False
+
+
+def is_http_ok(url, session=None, timeout_seconds=10) -> bool:
+    """用复用连接池的会话请求一次URL，返回是否为200"""
+    session = session or get_session()
+    try:
+        response = session.get(url, timeout=timeout_seconds)
+        if response.status_code == 200:
+            return True
+        print(f"预览地址返回 HTTP {response.status_code}")
+    except Exception as e:
+        print(f"请求预览地址失败: {e}")
+    return False
+
+
+def wait_for_http_ok(url, timeout_seconds=30, interval_seconds=3, session=None) -> bool:
+    """轮询URL直到返回200或超时"""
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        if is_http_ok(url, session=session):
+            return True
+        if time.monotonic() + interval_seconds > deadline:
+            return False
+        time.sleep(interval_seconds)
+
+
+def watch_start_requests(context, app_url):
+    """
+    在浏览器流程中记录触发工作区启动的请求（方法、URL、请求头、请求体），返回停止函数
+    停止时把记录到的请求保存到状态文件，下次快速路径按原样重放
+    """
+    captured = []
+
+    def on_finished(request):
+        if request.method == "GET" or not START_REQUEST_PATTERN.search(request.url):
+            return
+        try:
+            response = request.response()
+            if response is None or response.status >= 400:
+                return
+            headers = {name: value for name, value in request.all_headers().items()
+                       if name.lower() not in SKIP_HEADERS and not name.startswith(":")}
+        except Exception as e:
+            print(f"记录启动请求失败: {e}")
+            return
+        print(f"记录到启动工作区的请求: {request.method} {request.url}")
+        captured.append({"method": request.method, "url": request.url, "headers": headers,
+                         "body": request.post_data})
+
+    context.on("requestfinished", on_finished)
+
+    def stop():
+        context.remove_listener("requestfinished", on_finished)
+        if not captured:
+            return
+        with state_lock("idx_start_requests"):
+            saved = load_state(START_REQUESTS_FILE, {})
+            # 同一个请求只保留最新的一次
+            unique = {(entry["method"], entry["url"]): entry for entry in captured}
+            saved[app_url] = list(unique.values())[-MAX_START_REQUESTS:]
+            save_state(START_REQUESTS_FILE, saved)
+
+    return stop
+
+
+def _cookie_value(session, name):
+    for cookie in session.cookies:
+        if cookie.name == name and cookie.domain.endswith("google.com"):
+            return cookie.value
+    return None
+
+
+def _refresh_authorization(header, session, origin):
+    """
+    Google接口的 Authorization 是用 SAPISID 类cookie和时间戳算出的哈希，录制时的值会过期；
+    按当前会话的cookies重新计算: SAPISIDHASH <时间戳>_<sha1("时间戳 cookie值 origin")>
+    """
+    timestamp = int(time.time())
+    parts = []
+    for name, _ in re.findall(r"(\w+HASH) (\S+)", header):
+        value = _cookie_value(session, SAPISID_HASHES.get(name, ""))
+        if value is None:
+            return None
+        digest = hashlib.sha1(f"{timestamp} {value} {origin}".encode()).hexdigest()
+        parts.append(f"{name} {timestamp}_{digest}")
+    return " ".join(parts) or None
+
+
+def replay_start_requests(session, app_url) -> bool:
+    """重放浏览器流程中记录的启动请求，返回是否全部成功；没有记录时返回False"""
+    entries = load_state(START_REQUESTS_FILE, {}).get(app_url)
+    if not entries:
+        print("HTTP快速路径: 还没有记录到该工作区的启动请求（浏览器流程启动过一次工作区后才有），跳过")
+        return False
+    for entry in entries:
+        headers = dict(entry["headers"])
+        for name, value in entry["headers"].items():
+            if name.lower() == "authorization" and "HASH" in value:
+                origin = headers.get("origin") or headers.get("Origin") or "https://idx.google.com"
+                refreshed = _refresh_authorization(value, session, origin)
+                if refreshed is None:
+                    print("HTTP快速路径: cookies中缺少计算 Authorization 所需的 SAPISID")
+                    return False
+                headers[name] = refreshed
+        try:
+            response = session.request(entry["method"], entry["url"], headers=headers,
+                                       data=entry["body"].encode() if entry["body"] else None, timeout=15)
+        except Exception as e:
+            print(f"HTTP快速路径: 重放 {entry['url']} 失败: {e}")
+            return False
+        if "accounts.google.com" in response.url or response.status_code in (401, 403):
+            print(f"HTTP快速路径: cookies已失效（HTTP {response.status_code}）")
+            return False
+        if response.status_code >= 400:
+            print(f"HTTP快速路径: 重放 {entry['url']} 返回 HTTP {response.status_code}")
+            return False
+        print(f"HTTP快速路径: 已重放启动请求 {entry['method']} {entry['url']}")
+    return True
+
+
+def http_keepalive(app_url, web_url, cookies_path, verify_timeout=30) -> bool:
+    """
+    不启动浏览器的快速路径：
+    用已保存的cookies重放浏览器流程中记录的启动请求，再轮询预览地址确认已返回200
+    """
+    if not web_url or not Path(cookies_path).exists():
+        return False
+
+    session = get_session(cookies_path)
+    if not load_cookies_into_session(session, cookies_path):
+        return False
+
+    if not replay_start_requests(session, app_url):
+        return False
+
+    if wait_for_http_ok(web_url, timeout_seconds=verify_timeout, session=session):
+        print("HTTP快速路径: 预览地址已返回200")
+        return True
+    print("HTTP快速路径: 预览地址未能在限定时间内就绪")
+    return False
@@ -0,0 +1,125 @@
+"""
+IDX 工作区的本地替身，用于在不访问真实服务的情况下运行 main.py 的浏览器流程
+
+结构与真实IDE一致，main.py 使用的选择器都能命中：
+  /<任意路径>            工作区外壳，#iframe-container 中嵌入IDE框架
+  /_standin/ide          IDE框架，包含 "Web" 按钮；点击后嵌入以UUID命名的面板框架
+  /_standin/panel        面板框架，嵌入 title="Web" 的框架
+  /_standin/web          Web框架，嵌入 #previewFrame
+  /_standin/preview      预览页；可选先显示 "Try Again" 按钮，之后显示 "Starting server" 标题
+  /_standin/app          预览地址（WEB_URL），打开Web面板 --start-delay 秒后才返回200
+
+配合 STANDIN_HOSTS='{"idx.google.com": "<替身地址>"}' 使用，页面URL仍为 idx.google.com。
+
+用法: python idx_standin.py [--port 8091] [--start-delay 5] [--try-again]
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PANEL_FRAME_NAME = "ded0e382-bedf-478d-a870-33bb6cadac6f"
+
+WORKSPACE_PAGE = """<!doctype html>
+<html><head><title>IDX stand-in</title></head>
+<body><div id="iframe-container"><iframe src="/_standin/ide" width="1000" height="600"></iframe></div></body></html>
+"""
+IDE_PAGE = """<!doctype html>
+<html><body>
+  <button id="web">Web</button>
+  <div id="panel"></div>
+  <script>
+    document.getElementById('web').onclick = () => {
+      const frame = document.createElement('iframe');
+      frame.name = '%s';
+      frame.src = '/_standin/panel';
+      frame.width = 900; frame.height = 500;
+      document.getElementById('panel').replaceChildren(frame);
+    };
+  </script>
+</body></html>
+""" % PANEL_FRAME_NAME
+PANEL_PAGE = '<!doctype html><html><body><iframe title="Web" src="/_standin/web" width="880" height="480"></iframe></body></html>'
+WEB_PAGE = '<!doctype html><html><body><iframe id="previewFrame" src="/_standin/preview" width="860" height="460"></iframe></body></html>'
+TRY_AGAIN_PAGE = """<!doctype html>
+<html><body>
+  <p>Workspace is not responding</p>
+  <button onclick="location.reload()">Try Again</button>
+</body></html>
+"""
+STARTING_PAGE = "<!doctype html><html><body><h1>Starting server</h1></body></html>"
+
+
+def make_handler(state, start_delay, try_again):
+    """生成绑定了工作区状态的请求处理类"""
+
+    class StandinHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, content_type="text/html"):
+            body = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/_standin/ide":
+                self._send(200, IDE_PAGE)
+            elif path == "/_standin/panel":
+                with state["lock"]:
+                    # 打开Web面板即开始启动服务器
+                    if state["started_at"] is None:
+                        state["started_at"] = time.monotonic()
+                self._send(200, PANEL_PAGE)
+            elif path == "/_standin/web":
+                self._send(200, WEB_PAGE)
+            elif path == "/_standin/preview":
+                with state["lock"]:
+                    state["preview_loads"] += 1
+                    first_load = state["preview_loads"] == 1
+                self._send(200, TRY_AGAIN_PAGE if try_again and first_load else STARTING_PAGE)
+            elif path == "/_standin/app":
+                started_at = state["started_at"]
+                if started_at is not None and time.monotonic() - started_at >= start_delay:
+                    self._send(200, "serving", "text/plain")
+                else:
+                    self._send(503, "starting", "text/plain")
+            elif path == "/favicon.ico":
+                self._send(404, "")
+            else:
+                self._send(200, WORKSPACE_PAGE)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandinHandler
+
+
+def start_standin(port=0, start_delay=5, try_again=False):
+    """在后台线程中启动替身服务，返回 (server, 替身地址)"""
+    state = {"lock": threading.Lock(), "started_at": None, "preview_loads": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state, start_delay, try_again))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="IDX 工作区的本地替身")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--start-delay", type=float, default=5, help="打开Web面板后多少秒预览地址返回200")
+    parser.add_argument("--try-again", action="store_true", help="第一次加载预览时显示Try Again按钮")
+    args = parser.parse_args()
+
+    server, base_url = start_standin(args.port, args.start_delay, args.try_again)
+    print(f'STANDIN_HOSTS={{"idx.google.com": "{base_url}"}}')
+    print(f"WEB_URL={base_url}/_standin/app")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # 非Linux/macOS环境下不做跨进程加锁
+    fcntl = None
+
+# 跨运行持久化的状态目录（在 GitHub Actions 中通过 cache 保存/恢复）
+STATE_DIR = Path(os.getenv("KEEPALIVE_STATE_DIR", ".keepalive_state"))
+
+
+def load_state(name, default=None):
+    """读取状态文件，不存在或损坏时返回默认值"""
+    path = STATE_DIR / name
+    if not path.exists():
+        return default
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"读取状态文件 {path} 失败: {e}")
+        return default
+
+
+@contextmanager
+def state_lock(name):
+    """跨进程互斥锁（STATE_DIR/<name>.lock），包住 load_state/save_state 之间的读-改-写，避免并发进程互相覆盖"""
+    if fcntl is None:
+        yield
+        return
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(STATE_DIR / f"{name}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def save_state(name, data) -> None:
+    """写入状态文件（先写临时文件再替换，避免写到一半被中断）"""
+    path = STATE_DIR / name
+    try:
+        STATE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"保存状态文件 {path} 失败: {e}")
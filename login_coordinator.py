@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # 非Linux/macOS环境下不做跨进程加锁
+    fcntl = None
+
+# 等待其他进程完成登录的最长时间（秒）
+LOCK_TIMEOUT = int(os.getenv("LOGIN_LOCK_TIMEOUT", "300"))
+
+# 本进程内已发布的cookies，按账号索引: (cookies, 发布后cookies文件的修改时间)
+_published_cookies = {}
+
+
+def _lock_path(account, cookies_path):
+    digest = hashlib.sha1(account.encode()).hexdigest()[:12]
+    return Path(f"{cookies_path}.{digest}.lock")
+
+
+@contextmanager
+def account_lock(account, cookies_path, timeout=LOCK_TIMEOUT):
+    """同一账号的登录互斥锁（跨进程文件锁），超时后不再等待直接继续"""
+    if fcntl is None:
+        yield
+        return
+    lock_file = open(_lock_path(account, cookies_path), 'w')
+    locked = False
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    print(f"等待登录锁超时({timeout}秒)，不再等待")
+                    break
+                time.sleep(1)
+        yield
+    finally:
+        if locked:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+def write_cookies(cookies_path, cookies) -> None:
+    """原子地写入cookies文件，避免其他进程读到写了一半的文件"""
+    cookies_path = Path(cookies_path)
+    tmp_path = cookies_path.with_name(cookies_path.name + f".{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(cookies, f)
+    os.replace(tmp_path, cookies_path)
+
+
+def read_cookies(cookies_path):
+    """读取cookies文件，返回 (cookies或None, 读取时间)；读取时间用于判断之后是否有其他进程刷新过"""
+    read_at = time.time()
+    if not Path(cookies_path).exists():
+        return None, read_at
+    try:
+        with open(cookies_path, 'r') as f:
+            return json.load(f), read_at
+    except Exception as e:
+        print(f"读取 cookies 文件失败: {e}")
+        return None, read_at
+
+
+def publish_cookies(account, cookies_path, cookies) -> None:
+    """把登录得到的cookies分发给本进程和共享同一cookies文件的其他进程"""
+    write_cookies(cookies_path, cookies)
+    _published_cookies[account] = (cookies, Path(cookies_path).stat().st_mtime)
+
+
+def apply_shared_cookies(context, account, cookies_path) -> bool:
+    """把该账号最新发布的cookies加载到浏览器上下文"""
+    cookies, published_mtime = _published_cookies.get(account, (None, None))
+    try:
+        # 文件在本进程发布之后又被其他进程改写过时，内存中的副本已经过时，以文件为准
+        if cookies is None or Path(cookies_path).stat().st_mtime > published_mtime:
+            with open(cookies_path, 'r') as f:
+                cookies = json.load(f)
+        context.add_cookies(cookies)
+        return True
+    except Exception as e:
+        print(f"加载共享cookies失败: {e}")
+        return False
+
+
+def cookies_updated_since(cookies_path, since) -> bool:
+    """cookies文件是否在since（time.time()时间戳）之后被更新过"""
+    try:
+        return Path(cookies_path).stat().st_mtime > since
+    except OSError:
+        return False
+
+
+def single_flight_login(account, cookies_path, since, reuse, login, export_cookies, lock_timeout=LOCK_TIMEOUT) -> bool:
+    """
+    同一账号同一时间最多只进行一次密码登录
+    拿到锁后，如果cookies在since之后已被其他进程刷新，先调用reuse()复用；
+    复用失败才调用login()登录，登录成功后在持有锁时发布cookies
+    lock_timeout 为等待锁的最长时间（秒），调用方可按自己剩余的预算传入
+    """
+    with account_lock(account, cookies_path, timeout=lock_timeout):
+        if cookies_updated_since(cookies_path, since):
+            print("其他进程已完成该账号的登录，尝试复用其cookies...")
+            if reuse():
+                print("复用共享cookies成功，跳过密码登录")
+                return True
+            print("复用共享cookies失败，继续密码登录")
+        if not login():
+            return False
+        try:
+            publish_cookies(account, cookies_path, export_cookies())
+            print("cookies已保存并共享给同账号的其他工作区")
+        except Exception as e:
+            print(f"保存cookies失败: {e}，但将继续执行")
+        return True
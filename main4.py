@@ -1,9 +1,121 @@
 import re
 import os
 import json
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from playwright.sync_api import Playwright, sync_playwright, expect, TimeoutError
+from urllib.parse import urlsplit
+from typing import TYPE_CHECKING
+import metrics
+from browser_setup import har_name, launch_browser, new_context
+from circuit_breaker import HALF_OPEN, check_circuit, record_failure, record_success
+from deadline import Deadline, bounded_ms
+from idx_backoff import plan_refresh_schedule, record_cold_start, record_cold_start_failure
+from idx_http import check_http_ok, get_session, http_keepalive, is_http_ok, watch_start_requests
+from login_coordinator import apply_shared_cookies, read_cookies, single_flight_login, write_cookies
+from tracing import start_tracing, stop_tracing
+
+# 整次运行的阶段及名义预算（秒），总预算可通过 RUN_BUDGET 环境变量调整
+RUN_PHASES = [
+    ("startup", 60),
+    ("auth", 150),
+    ("workspace", 240),
+    ("hold", 60),
+]
+
+# Playwright 只在真正需要浏览器时才导入，目标健康时脚本只用标准库即可退出
+if TYPE_CHECKING:
+    from playwright.sync_api import Playwright
+
+# 各阶段的加载完成条件，替代 networkidle（IDE页面有长轮询，networkidle 经常要等满超时）
+# url: 当前URL需匹配的正则; selector: 需已挂载到DOM的元素; request: 需已完成的请求URL正则
+# 可通过环境变量 IDX_LOAD_PREDICATES 以JSON覆盖，例如 '{"workspace": {"request": "workstations"}}'
+LOAD_PREDICATES = {
+    "workspace": {
+        "url": r"idx\.google\.com/",
+        "selector": "#iframe-container iframe",
+    },
+    "signin": {
+        "url": r"accounts\.google\.com",
+        "selector": 'input[type="email"], input[type="password"], [data-identifier]',
+    },
+}
+
+def _load_predicates():
+    predicates = {phase: dict(conditions) for phase, conditions in LOAD_PREDICATES.items()}
+    override = os.environ.get("IDX_LOAD_PREDICATES", "")
+    if override:
+        try:
+            for phase, conditions in json.loads(override).items():
+                predicates.setdefault(phase, {}).update(conditions)
+        except Exception as e:
+            print(f"解析 IDX_LOAD_PREDICATES 失败: {e}，使用默认条件")
+    return predicates
+
+PHASE_PREDICATES = _load_predicates()
+
+def wait_for_phase(page, phase, action=None, timeout=60000):
+    """执行action（通常是导航）后等待该阶段的所有完成条件满足，满足返回True，超时返回False"""
+    predicate = PHASE_PREDICATES.get(phase, {})
+    url_pattern = predicate.get("url")
+    selector = predicate.get("selector")
+    request_pattern = predicate.get("request")
+    deadline = time.monotonic() + timeout / 1000
+    
+    def remaining_ms():
+        # Playwright中timeout=0表示不限时，因此至少保留1毫秒
+        return max(1, (deadline - time.monotonic()) * 1000)
+    
+    # 请求监听需要在导航之前挂上，否则会错过已完成的请求
+    finished_requests = []
+    def on_request_finished(request):
+        if re.search(request_pattern, request.url):
+            finished_requests.append(request.url)
+    if request_pattern:
+        page.on("requestfinished", on_request_finished)
+    
+    try:
+        if action:
+            try:
+                action()
+            except Exception as e:
+                print(f"阶段 {phase} 导航失败: {e}，继续等待完成条件")
+        if url_pattern:
+            page.wait_for_url(re.compile(url_pattern), wait_until="commit", timeout=remaining_ms())
+        if selector:
+            page.wait_for_selector(selector, state="attached", timeout=remaining_ms())
+        if request_pattern:
+            while not finished_requests:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"等待请求 {request_pattern} 完成超时")
+                page.wait_for_timeout(200)
+        print(f"阶段 {phase} 加载完成")
+        return True
+    except Exception as e:
+        print(f"等待阶段 {phase} 完成条件失败: {e}")
+        return False
+    finally:
+        if request_pattern:
+            page.remove_listener("requestfinished", on_request_finished)
+
+def locator_exists(locator) -> bool:
+    """
+    判断定位器当前是否匹配到元素（不等待）
+    Locator/FrameLocator 对象本身总是为真，不能直接用 if 判断元素是否存在
+    """
+    try:
+        return locator.count() > 0
+    except Exception:
+        return False
+
+def wait_for_locator(locator, timeout=5000, state="visible") -> bool:
+    """在限定时间内等待元素达到指定状态，超时返回False而不是抛出异常"""
+    try:
+        locator.first.wait_for(state=state, timeout=timeout)
+        return True
+    except Exception:
+        return False
 
 def wait_for_element_with_retry(page, locator, description, timeout_seconds=10, max_attempts=3):
     """尝试等待元素出现，如果超时则返回False，成功则返回True"""
@@ -22,14 +134,38 @@ def wait_for_element_with_retry(page, locator, description, timeout_seconds=10,
                 return False
     return False
 
-def check_and_click_try_again(page, max_attempts=5):
-    """检查并点击Try Again按钮，如果存在的话"""
+def probe_first_visible(page, candidates, timeout_ms=3000, step_ms=250):
+    """
+    同时探测多个候选定位器，共用一个超时时间
+    任一候选可见即返回其名称，其余候选不再探测；全部不可见时返回None
+    """
+    remaining = dict(candidates)
+    waited = 0
+    while remaining:
+        for name, locator in list(remaining.items()):
+            try:
+                if locator.is_visible():
+                    return name
+            except Exception as e:
+                # 候选框架已不存在，后续轮次不再探测
+                print(f"探测iframe {name} 失败: {e}")
+                remaining.pop(name, None)
+        if waited >= timeout_ms:
+            break
+        page.wait_for_timeout(step_ms)
+        waited += step_ms
+    return None
+
+def check_and_click_try_again(page, max_attempts=5, probe_timeout=3000, deadline=None):
+    """检查并点击Try Again按钮，如果存在的话（所有候选iframe并行探测）；各次等待受deadline当前阶段剩余时间限制"""
+    try_again_found = False
     for attempt in range(max_attempts):
+        if deadline is not None and deadline.phase_expired():
+            print("当前阶段的预算已用完，不再检查Try Again按钮")
+            break
         try:
             print(f"检查Try Again按钮是否存在，第{attempt + 1}次尝试...")
             
-            try_again_found = False
-            
             # 使用动态匹配iframe name的路径查找Try Again按钮
             try:
                 print("使用动态匹配查找Try Again按钮...")
@@ -38,212 +174,602 @@ def check_and_click_try_again(page, max_attempts=5):
                 outer_frame = page.frame_locator("#iframe-container iframe >> nth=0")
                 
                 # 获取所有frame，查找匹配模式的iframe name
-                all_frames = page.frames
-                target_iframe_names = []
-                
-                for frame in all_frames:
+                candidates = {}
+                for frame in page.frames:
                     try:
                         frame_name = frame.name
                         # 查找符合UUID格式的iframe name（包含连字符的长字符串）
-                        if frame_name and len(frame_name) > 30 and '-' in frame_name:
+                        if frame_name and len(frame_name) > 30 and '-' in frame_name and frame_name not in candidates:
                             print(f"找到可能的目标iframe: {frame_name}")
-                            target_iframe_names.append(frame_name)
+                            # 使用找到的iframe name构建路径
+                            candidates[frame_name] = outer_frame.frame_locator(f"iframe[name=\"{frame_name}\"]").frame_locator("iframe[title=\"Web\"]").frame_locator("#previewFrame").get_by_role("button", name="Try Again")
                     except Exception:
                         continue
                 
-                # 尝试所有找到的iframe名称
-                for target_iframe_name in target_iframe_names:
-                    try:
-                        print(f"尝试使用iframe: {target_iframe_name}")
-                        # 使用找到的iframe name构建路径
-                        try_again_button = outer_frame.frame_locator(f"iframe[name=\"{target_iframe_name}\"]").frame_locator("iframe[title=\"Web\"]").frame_locator("#previewFrame").get_by_role("button", name="Try Again")
-                        
-                        if try_again_button.is_visible(timeout=3000):
-                            print(f"通过动态匹配找到Try Again按钮（iframe: {target_iframe_name}），点击...")
-                            try_again_button.click()
-                            try_again_found = True
-                            print("✓ 成功点击Try Again按钮（动态匹配）")
-                            page.wait_for_timeout(3000)
-                            return True
-                        else:
-                            print(f"Try Again按钮在iframe {target_iframe_name} 中不可见")
-                    except Exception as e:
-                        print(f"使用iframe {target_iframe_name} 失败: {e}")
-                        continue
-                
-                if not target_iframe_names:
+                if not candidates:
                     print("未找到符合UUID格式的iframe name")
-                elif not try_again_found:
-                    print("找到了iframe但Try Again按钮不可见或无法点击")
+                else:
+                    # 所有候选共用一个探测超时，而不是每个候选各等一次
+                    hit = probe_first_visible(page, candidates, timeout_ms=bounded_ms(deadline, probe_timeout))
+                    if hit:
+                        print(f"通过动态匹配找到Try Again按钮（iframe: {hit}），点击...")
+                        candidates[hit].click()
+                        try_again_found = True
+                        print("✓ 成功点击Try Again按钮（动态匹配）")
+                        page.wait_for_timeout(bounded_ms(deadline, 3000))
+                        return True
+                    print(f"Try Again按钮在{len(candidates)}个候选iframe中都不可见")
                     
             except Exception as e:
                 print(f"通过动态匹配查找Try Again按钮失败: {e}")
             
             # 如果找到了但没有成功点击，等待后重试
-            if not try_again_found:
-                print("未找到或无法点击Try Again按钮，等待2秒后重试...")
-                page.wait_for_timeout(2000)
-            else:
-                break
+            print("未找到或无法点击Try Again按钮，等待2秒后重试...")
+            page.wait_for_timeout(bounded_ms(deadline, 2000))
                 
         except Exception as e:
             print(f"检查Try Again按钮时发生错误: {e}")
-            page.wait_for_timeout(2000)
+            page.wait_for_timeout(bounded_ms(deadline, 2000))
     
-    if not try_again_found:
-        print("在所有尝试中都未能找到或点击Try Again按钮")
+    print("在所有尝试中都未能找到或点击Try Again按钮")
     return try_again_found
 
-def refresh_page_and_wait(page, url, refresh_attempts=3, total_wait_time=240):
-    """刷新页面并等待指定元素，总共尝试指定次数"""
-    start_time = page.evaluate("() => Date.now()")
-    elapsed_time = 0
-    refresh_count = 0
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def watch_preview_ready(page, web_url):
+    """监听预览地址的网络响应和websocket，预览源返回成功响应即视为服务器已启动"""
+    preview_origin = _origin(web_url)
+    state = {"ready": False, "detail": None}
+    
+    def on_response(response):
+        if state["ready"] or _origin(response.url) != preview_origin:
+            return
+        if 200 <= response.status < 300:
+            state["ready"] = True
+            state["detail"] = f"HTTP {response.status} {response.url}"
     
-    web_button_found = False
-    starting_server_found = False
+    def on_websocket(websocket):
+        if not state["ready"] and _origin(websocket.url.replace("ws", "http", 1)) == preview_origin:
+            state["ready"] = True
+            state["detail"] = f"WebSocket {websocket.url}"
     
-    while elapsed_time < total_wait_time * 1000 and refresh_count < refresh_attempts:
-        # 如果两个元素都未找到，刷新页面
-        if not (web_button_found and starting_server_found):
-            print(f"刷新页面，第{refresh_count + 1}次尝试...")
+    page.on("response", on_response)
+    page.on("websocket", on_websocket)
+    
+    def stop():
+        page.remove_listener("response", on_response)
+        page.remove_listener("websocket", on_websocket)
+    
+    return state, stop
+
+def wait_or_ready(page, state, timeout_ms, step_ms=500):
+    """等待指定时间，期间一旦预览源就绪立即返回"""
+    waited = 0
+    while waited < timeout_ms:
+        if state and state["ready"]:
+            return True
+        page.wait_for_timeout(min(step_ms, timeout_ms - waited))
+        waited += step_ms
+    return bool(state and state["ready"])
+
+def hold_until_serving(page, web_url, max_hold=60000, interval=3000, cookies_path=None) -> bool:
+    """保持页面打开，直到预览地址返回200（最多等待max_hold毫秒），返回预览是否已就绪；cookies_path 决定使用哪个账号的会话"""
+    if not web_url:
+        page.wait_for_timeout(max_hold)
+        return False
+    start = time.monotonic()
+    while (time.monotonic() - start) * 1000 < max_hold:
+        if is_http_ok(web_url, session=get_session(cookies_path)):
+            print(f"预览地址已返回200，提前释放浏览器（保持了 {int(time.monotonic() - start)} 秒）")
+            return True
+        page.wait_for_timeout(interval)
+    print(f"预览地址在 {max_hold // 1000} 秒内未返回200")
+    return False
+
+# 在页面内一次性判断当前处于Google登录流程的哪个界面，避免逐个选择器试探并等待超时
+# 返回值: account_chooser / email / password / challenge / done / unknown
+SIGNIN_SCREEN_JS = """() => {
+    const visible = (el) => !!el && !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    if (location.hostname.endsWith('idx.google.com') && !location.href.includes('signin')) {
+        return 'done';
+    }
+    if (location.hostname !== 'accounts.google.com') {
+        return 'unknown';
+    }
+    if (visible(document.querySelector('input[type="password"]'))) {
+        return 'password';
+    }
+    if (visible(document.querySelector('input[type="email"], #identifierId'))) {
+        return 'email';
+    }
+    if (document.querySelector('[data-identifier]') || document.body.innerText.includes('Choose an account')) {
+        return 'account_chooser';
+    }
+    if (location.pathname.includes('/challenge/')) {
+        return 'challenge';
+    }
+    return 'unknown';
+}"""
+
+# 登录流程最多执行的操作步数（选择账户、输入邮箱、输入密码，再加上重试余量）
+MAX_SIGNIN_STEPS = 6
+
+def classify_signin_screen(page, previous=None, timeout=15000):
+    """
+    判断当前登录界面；给出previous时在浏览器内轮询，直到界面变为其他已知界面
+    超时返回previous（界面没有变化）或unknown
+    """
+    wait_js = f"""(prev) => {{
+        const screen = ({SIGNIN_SCREEN_JS})();
+        return screen !== prev && screen !== 'unknown' ? screen : false;
+    }}"""
+    deadline = time.monotonic() + timeout / 1000
+    while True:
+        try:
+            handle = page.wait_for_function(wait_js, arg=previous,
+                                            timeout=max(1, (deadline - time.monotonic()) * 1000))
+            return handle.json_value()
+        except Exception as e:
+            # 跳转过程中执行上下文会被销毁，等新页面加载后继续判断
+            if time.monotonic() >= deadline or "Timeout" in type(e).__name__ or "Timeout" in str(e):
+                try:
+                    return page.evaluate(SIGNIN_SCREEN_JS)
+                except Exception:
+                    return previous or "unknown"
             try:
-                page.goto(url, timeout=30000)
-                page.wait_for_load_state("domcontentloaded", timeout=60000)
-                page.wait_for_load_state("networkidle", timeout=60000)
-            except Exception as e:
-                print(f"页面刷新或加载失败: {e}，但将继续执行")
-            
-            refresh_count += 1
+                page.wait_for_load_state("domcontentloaded", timeout=5000)
+            except Exception:
+                pass
+
+def _click_next(page):
+    """点击登录界面的下一步按钮"""
+    next_button = page.get_by_role("button", name="Next")
+    if locator_exists(next_button):
+        next_button.first.click()
+        return True
+    # 尝试备用方法查找下一步按钮
+    next_button = page.query_selector('button[jsname="LgbsSe"]')
+    if next_button:
+        next_button.click()
+        return True
+    print("无法找到下一步按钮，但将继续执行")
+    return False
+
+def _choose_account(page, email):
+    """在'Choose an account'界面选择对应账户"""
+    # 方法1: 通过账户条目的data-identifier查找
+    account = page.locator(f'[data-identifier="{email}"]')
+    if not locator_exists(account):
+        # 方法2: 直接通过邮箱文本查找
+        account = page.get_by_text(email)
+    if locator_exists(account):
+        print(f"找到包含邮箱的账户，点击...")
+        account.first.click()
+        return
+    # 方法3: 点击第一个账户选项
+    print("未找到匹配的邮箱账户，尝试点击第一个选项...")
+    first_account = page.query_selector('[data-identifier], .OVnw0d')
+    if first_account:
+        first_account.click()
+    else:
+        print("无法找到任何账户选项")
+
+def _submit_email(page, email):
+    """填写邮箱并点击下一步"""
+    print("输入邮箱...")
+    email_field = page.locator('input[type="email"], #identifierId').first
+    email_field.fill(email)
+    _click_next(page)
+
+def _submit_password(page, password):
+    """填写密码并点击下一步"""
+    print("输入密码...")
+    password_field = page.locator('input[type="password"]:visible').first
+    password_field.fill(password)
+    if _click_next(page):
+        print("提交密码")
+
+def login_with_password(page, email, password, app_url, deadline=None) -> bool:
+    """使用密码登录Google账号：每一步先判断当前登录界面再直接执行对应操作，登录后能访问工作区页面则返回True"""
+    print("开始密码登录流程...")
+    
+    # 确保在登录页面
+    if "signin" not in page.url:
+        wait_for_phase(page, "signin", action=lambda: page.goto(app_url, timeout=bounded_ms(deadline, 60000)),
+                       timeout=bounded_ms(deadline, 60000))
+    
+    screen = classify_signin_screen(page, timeout=bounded_ms(deadline, 15000))
+    for _ in range(MAX_SIGNIN_STEPS):
+        print(f"当前登录界面: {screen}")
+        if screen in ("done", "unknown"):
+            break
+        if screen == "challenge":
+            print("Google要求额外验证（如两步验证），无法自动完成登录")
+            return False
+        try:
+            if screen == "account_chooser":
+                _choose_account(page, email)
+            elif screen == "email":
+                _submit_email(page, email)
+            elif screen == "password":
+                _submit_password(page, password)
+        except Exception as e:
+            print(f"登录界面 {screen} 操作失败: {e}，但将继续执行")
+        if deadline is not None and deadline.phase_expired():
+            print("登录阶段预算已用完")
+            break
+        next_screen = classify_signin_screen(page, previous=screen, timeout=bounded_ms(deadline, 15000))
+        # 操作后界面没有变化（如密码错误、跳转过慢）时不再重复提交，避免触发Google的频率限制
+        if next_screen == screen:
+            print(f"登录界面 {screen} 操作后没有变化，停止重复提交")
+            break
+        screen = next_screen
+    
+    # 等待登录完成并跳转
+    if not _is_workspace_url(page.url):
+        try:
+            page.goto(app_url, timeout=bounded_ms(deadline, 30000))
+        except Exception as e:
+            print(f"跳转到目标页面失败: {e}，但将继续执行")
+    
+    # 使用与cookie登录相同的判断标准验证登录是否成功
+    current_url = page.url
+    if _is_workspace_url(current_url):
+        print("密码登录成功!")
+        return True
+    print(f"登录可能不成功，当前URL: {current_url}，但将继续执行")
+    return False
+
+# IDX保活流程的状态，按正常推进顺序排列
+STATE_AUTH = "auth"
+STATE_WORKSPACE_LOADED = "workspace-loaded"
+STATE_WEB_PANEL_OPEN = "web-panel-open"
+STATE_TRY_AGAIN = "try-again"
+STATE_STARTING = "starting"
+STATE_SERVING = "serving"
+STATE_DONE = "done"
+
+# 浏览器流程 run() 的结果: 被快速路径中止的既不算成功也不算失败
+RUN_SUCCESS = "success"
+RUN_FAILED = "failed"
+RUN_CANCELLED = "cancelled"
+
+# 进入工作区之后的状态，受自适应总等待预算限制
+WORKSPACE_STATES = (STATE_WORKSPACE_LOADED, STATE_WEB_PANEL_OPEN, STATE_TRY_AGAIN, STATE_STARTING, STATE_SERVING)
+
+# 每个状态失败后在原地（从上一个检查点）重试的次数
+MAX_STATE_RETRIES = {
+    STATE_AUTH: 0,
+    STATE_WORKSPACE_LOADED: 1,
+    STATE_WEB_PANEL_OPEN: 2,
+    STATE_STARTING: 0,
+}
+
+# 重试用完后退回的检查点，None 表示放弃
+# 启动等待超时退回到工作区加载，即按自适应间隔刷新页面
+FALLBACK_STATES = {
+    STATE_AUTH: None,
+    STATE_WORKSPACE_LOADED: STATE_AUTH,
+    STATE_WEB_PANEL_OPEN: STATE_WORKSPACE_LOADED,
+    STATE_STARTING: STATE_WORKSPACE_LOADED,
+}
+
+def _is_workspace_url(url):
+    # 检测登录状态：如果URL包含idx.google.com但不包含signin，则已登录成功
+    return "idx.google.com" in url and "signin" not in url
+
+def step_auth(page, flow):
+    """认证: 先用cookies访问工作区，无效时通过登录协调器进行密码登录"""
+    context = flow["context"]
+    app_url = flow["app_url"]
+    deadline = flow["deadline"]
+    if deadline.phase != "auth":
+        deadline.start_phase("auth")
+    
+    print(f"访问目标页面")
+    try:
+        page.goto(app_url, timeout=deadline.timeout_ms(30000))
+    except Exception as e:
+        print(f"页面加载超时: {e}")
+    
+    if flow["cookies_loaded"] and _is_workspace_url(page.url):
+        print("已经通过cookies登录成功!")
+        login_path = "cookies"
+    else:
+        print("cookies无效，通过登录协调器进行密码登录（同账号同一时间只登录一次）...")
         
-        # 尝试查找Web按钮
-        if not web_button_found:
-            try:
-                web_button_selector = "#iframe-container iframe >> nth=0"
-                frame = page.frame_locator(web_button_selector)
-                if frame:
-                    web_button = frame.get_by_text("Web", exact=True)
-                    if web_button:
-                        page.wait_for_timeout(20000)  # 等待20秒
-                        print("找到Web按钮，点击...")
-                        web_button.click()
-                        web_button_found = True
-                        
-                        # Web按钮点击后，等待一段时间然后检查Try Again按钮
-                        print("Web按钮已点击，等待页面响应...")
-                        page.wait_for_timeout(5000)  # 等待5秒让页面响应
-                        
-                        # 检查并点击Try Again按钮（如果存在）
-                        try:
-                            print("检查Web按钮点击后是否需要点击Try Again按钮...")
-                            check_and_click_try_again(page, max_attempts=3)
-                        except Exception as e:
-                            print(f"检查Try Again按钮时出错: {e}，但将继续执行")
-                            
-                    else:
-                        print("找不到Web按钮")
-                else:
-                    print("找不到包含Web按钮的框架")
-            except Exception as e:
-                print(f"查找或点击Web按钮失败: {e}")
+        login_path = "password"
         
-        # 尝试查找Starting server文本
-        if web_button_found and not starting_server_found:
+        def reuse_shared_cookies():
+            nonlocal login_path
+            if not apply_shared_cookies(context, flow["email"], flow["cookies_path"]):
+                return False
             try:
-                # 给页面一些时间来响应Web按钮点击
-                page.wait_for_timeout(3000)  # 等待3秒
-                
-                starting_server_selector = "#iframe-container iframe >> nth=0"
-                iframe_chain = page.frame_locator(starting_server_selector)
-                
-                # 尝试通过多层iframe定位Starting server文本
-                try:
-                    inner_frame = iframe_chain.frame_locator("iframe[name=\"ded0e382-bedf-478d-a870-33bb6cadac6f\"]")
-                    if inner_frame:
-                        web_frame = inner_frame.frame_locator("iframe[title=\"Web\"]")
-                        if web_frame:
-                            preview_frame = web_frame.frame_locator("#previewFrame")
-                            if preview_frame:
-                                starting_server = preview_frame.get_by_role("heading", name="Starting server")
-                                if starting_server:
-                                    print("找到Starting server文本")
-                                    starting_server_found = True
-                                else:
-                                    print("找不到Starting server文本")
-                            else:
-                                print("找不到预览框架")
-                        else:
-                            print("找不到Web框架")
-                    else:
-                        print("找不到内部框架")
-                except Exception as e:
-                    print(f"通过多层iframe查找Starting server失败: {e}")
-                    
-                # 如果上面的方法失败，尝试直接在可见的框架中搜索
-                if not starting_server_found:
-                    try:
-                        all_frames = page.frames
-                        for frame in all_frames:
-                            try:
-                                heading = frame.get_by_role("heading", name="Starting server")
-                                if heading:
-                                    print("通过框架搜索找到Starting server文本")
-                                    starting_server_found = True
-                                    break
-                            except:
-                                continue
-                    except Exception as e:
-                        print(f"通过遍历所有框架查找Starting server失败: {e}")
+                page.goto(app_url, timeout=deadline.timeout_ms(30000))
             except Exception as e:
-                print(f"查找或点击Starting server文本失败: {e}")
-        
-        # 如果两个元素都找到了，跳出循环
-        if web_button_found and starting_server_found:
-            print("Web按钮和Starting server文本都已找到")
-            break
+                print(f"跳转到目标页面失败: {e}")
+            if _is_workspace_url(page.url):
+                login_path = "shared"
+                return True
+            return False
         
-        # 短暂等待后继续尝试
-        page.wait_for_timeout(5000)  # 等待5秒
-        elapsed_time = page.evaluate("() => Date.now()") - start_time
-        print(f"已经等待了 {int(elapsed_time/1000)} 秒，剩余等待时间 {int(total_wait_time - elapsed_time/1000)} 秒")
+        single_flight_login(
+            flow["email"],
+            flow["cookies_path"],
+            flow["cookies_checked_at"],
+            reuse=reuse_shared_cookies,
+            login=lambda: login_with_password(page, flow["email"], flow["password"], app_url, deadline),
+            export_cookies=context.cookies,
+            # 等锁不超过认证阶段剩余的时间
+            lock_timeout=deadline.phase_remaining(),
+        )
+    
+    current_url = page.url
+    print(f"当前URL: {current_url}")
+    if not _is_workspace_url(current_url):
+        print(f"警告: 当前页面URL与目标URL不完全匹配，登录可能不成功")
+        flow["login_path"] = "failed"
+        return None
+    # 登录方式由 _keepalive_target() 在得出最终结果后统一计数（快速路径胜出时记为http）
+    flow["login_path"] = login_path
     
-    # 返回两个元素是否都找到
-    return web_button_found and starting_server_found
+    # 保存最新的cookies状态
+    try:
+        print("保存最终的cookies状态...")
+        write_cookies(flow["cookies_path"], context.cookies())
+        print("Cookies保存成功!")
+    except Exception as e:
+        print(f"保存最终cookies失败: {e}，但将继续执行")
+    
+    print("成功访问目标页面！")
+    return STATE_WORKSPACE_LOADED
 
-def run(playwright: Playwright) -> None:
-    # Get credentials from environment variables - format: "email password"
-    google_pw = os.environ.get("GOOGLE_PW", "")
-    credentials = google_pw.split(' ', 1) if google_pw else []
+def step_load_workspace(page, flow):
+    """工作区加载: 只有需要刷新或当前不在工作区页面时才重新导航"""
+    app_url = flow["app_url"]
+    deadline = flow["deadline"]
+    if flow["reload"] or not page.url.startswith(app_url):
+        print(f"刷新页面，第{flow['refreshes'] + 1}次...")
+        loaded = wait_for_phase(page, "workspace", action=lambda: page.goto(app_url, timeout=deadline.timeout_ms(30000)),
+                                timeout=deadline.timeout_ms(60000))
+        flow["refreshes"] += 1
+        flow["reload"] = False
+    else:
+        loaded = wait_for_phase(page, "workspace", timeout=deadline.timeout_ms(60000))
+    return STATE_WEB_PANEL_OPEN if loaded else None
+
+def step_open_web_panel(page, flow):
+    """打开Web面板: 点击IDE中的Web按钮"""
+    web_button_selector = "#iframe-container iframe >> nth=0"
+    if not locator_exists(page.locator(web_button_selector)):
+        print("找不到包含Web按钮的框架")
+        return None
+    web_button = page.frame_locator(web_button_selector).get_by_text("Web", exact=True)
+    # IDE加载较慢，最多等待20秒Web按钮出现，出现即点击
+    if not wait_for_locator(web_button, timeout=flow["deadline"].timeout_ms(20000)):
+        print("找不到Web按钮")
+        return None
+    print("找到Web按钮，点击...")
+    web_button.first.click()
     
-    email = credentials[0] if len(credentials) > 0 else None
-    password = credentials[1] if len(credentials) > 1 else None
+    # Web按钮点击后，等待一段时间让页面响应
+    print("Web按钮已点击，等待页面响应...")
+    wait_or_ready(page, flow["preview"], flow["deadline"].timeout_ms(5000))  # 等待5秒让页面响应
+    return STATE_TRY_AGAIN
+
+def step_try_again(page, flow):
+    """检查并点击Try Again按钮（如果存在），不存在也继续"""
+    try:
+        print("检查Web按钮点击后是否需要点击Try Again按钮...")
+        if check_and_click_try_again(page, max_attempts=3, deadline=flow["deadline"]):
+            metrics.inc("keepalive_try_again_clicks_total", target=flow["app_url"])
+    except Exception as e:
+        print(f"检查Try Again按钮时出错: {e}，但将继续执行")
+    return STATE_STARTING
+
+def find_starting_server(page):
+    """在预览框架中查找Starting server文本，只有元素确实存在时才返回True"""
+    starting_server_selector = "#iframe-container iframe >> nth=0"
+    iframe_chain = page.frame_locator(starting_server_selector)
     
-    app_url = os.environ.get("APP_URL4", "https://idx.google.com/app-43646734")
-    cookies_path = Path("google_cookies.json")
+    # 尝试通过多层iframe定位Starting server文本
+    try:
+        preview_frame = (iframe_chain.frame_locator("iframe[name=\"ded0e382-bedf-478d-a870-33bb6cadac6f\"]")
+                         .frame_locator("iframe[title=\"Web\"]")
+                         .frame_locator("#previewFrame"))
+        if locator_exists(preview_frame.get_by_role("heading", name="Starting server")):
+            print("找到Starting server文本")
+            return True
+    except Exception as e:
+        print(f"通过多层iframe查找Starting server失败: {e}")
     
-    # Check if credentials are available
-    if not email or not password:
-        print("错误: 缺少凭据。请设置 GOOGLE_PW 环境变量，格式为 '账号 密码'。")
-        print("例如:")
-        print("  export GOOGLE_PW='your.email@gmail.com your_password'")
-        return
+    # 如果上面的方法失败，直接在所有框架中搜索
+    try:
+        for frame in page.frames:
+            try:
+                if locator_exists(frame.get_by_role("heading", name="Starting server")):
+                    print("通过框架搜索找到Starting server文本")
+                    return True
+            except Exception:
+                continue
+    except Exception as e:
+        print(f"通过遍历所有框架查找Starting server失败: {e}")
+    print("找不到Starting server文本")
+    return False
+
+def step_starting(page, flow):
+    """
+    等待服务器开始启动: 在本次刷新间隔内轮询
+    间隔用完仍未启动则失败，退回检查点刷新页面（避免过早刷新打断正在启动的服务器）
+    """
+    intervals = flow["refresh_intervals"]
+    interval = intervals[min(flow["refreshes"], len(intervals) - 1)]
+    interval = min(interval, flow["deadline"].phase_remaining())
+    deadline = time.monotonic() + interval
+    print(f"等待服务器启动，本轮最多 {int(interval)} 秒...")
+    while True:
+        if flow["preview"] and flow["preview"]["ready"]:
+            return STATE_SERVING
+        # 启用网络层检测时不再跨框架轮询DOM
+        if not flow["preview"] and find_starting_server(page):
+            return STATE_SERVING
+        # 标题可能不出现（工作区已在运行、界面改版），直接确认预览地址可用，避免误判为失败后刷新
+        if flow["web_url"] and is_http_ok(flow["web_url"], session=get_session(flow["cookies_path"]), timeout_seconds=5):
+            print("预览地址已返回200，服务器已启动")
+            return STATE_SERVING
+        if time.monotonic() >= deadline or (flow["cancel"] and flow["cancel"]()):
+            print("本轮刷新间隔内服务器未启动")
+            return None
+        wait_or_ready(page, flow["preview"], min(5000, max(1, int((deadline - time.monotonic()) * 1000))))  # 等待5秒
+
+def step_serving(page, flow):
+    """服务器已开始启动: 等待预览就绪后结束，预览确认可用时记录冷启动耗时"""
+    serving = bool(flow["preview"] and flow["preview"]["ready"])
+    if serving:
+        print(f"预览地址已响应，服务器已启动: {flow['preview']['detail']}")
+    deadline = flow["deadline"]
+    deadline.start_phase("hold")
+    # 没有预览地址时只能固定等待，IDX_HOLD_SECONDS 可调整（离线回放基准中设为0）
+    max_hold = deadline.timeout_ms(int(os.environ.get("IDX_HOLD_SECONDS", "60")) * 1000)
+    print(f"服务器已开始启动，等待预览就绪后退出（最多{max_hold // 1000}秒）...")
+    if hold_until_serving(page, flow["web_url"], max_hold=max_hold, cookies_path=flow["cookies_path"]):
+        serving = True
+    # 冷启动耗时从进入工作区算到预览真正可用，而不是看到 Starting server 标题；
+    # 无法确认（没有预览地址或保持期内未返回200）时不记录样本，也不算失败
+    if serving:
+        record_cold_start(flow["app_url"], time.monotonic() - flow["workspace_started"])
+    flow["cold_start_recorded"] = True
+    return STATE_DONE
+
+FLOW_STEPS = {
+    STATE_AUTH: step_auth,
+    STATE_WORKSPACE_LOADED: step_load_workspace,
+    STATE_WEB_PANEL_OPEN: step_open_web_panel,
+    STATE_TRY_AGAIN: step_try_again,
+    STATE_STARTING: step_starting,
+    STATE_SERVING: step_serving,
+}
+
+def _enter_workspace(page, flow):
+    """第一次进入工作区阶段: 规划自适应刷新间隔，按需挂上网络层就绪检测"""
+    flow["refresh_intervals"], flow["total_wait_time"] = plan_refresh_schedule(
+        flow["app_url"], flow["refresh_attempts"], flow["total_wait_time"])
+    print(f"自适应刷新计划: 间隔 {[int(i) for i in flow['refresh_intervals']]} 秒，总等待预算 {flow['total_wait_time']} 秒")
+    flow["deadline"].start_phase("workspace", cap=flow["total_wait_time"])
+    flow["workspace_started"] = time.monotonic()
     
-    browser = None
+    # 网络层就绪检测: 订阅预览源的响应，代替跨框架轮询Starting server
+    web_url = flow["web_url"]
+    if web_url and os.environ.get("IDX_READY_SIGNAL", "dom") == "network":
+        print(f"使用网络层检测预览就绪: {_origin(web_url)}")
+        # 退回认证后会再次进入工作区阶段，先移除上一次挂上的监听
+        if flow["stop_watching"]:
+            flow["stop_watching"]()
+        flow["preview"], flow["stop_watching"] = watch_preview_ready(page, web_url)
+
+def run_keepalive_flow(page, flow) -> bool:
+    """
+    按状态推进保活流程，每个状态成功后记录检查点
+    失败时先在当前状态重试，重试用完再退回到对应检查点，而不是从登录重新开始
+    """
+    while flow["state"] != STATE_DONE:
+        state = flow["state"]
+        if flow["cancel"] and flow["cancel"]():
+            print("HTTP快速路径已成功，中止浏览器流程")
+            flow["cancelled"] = True
+            break
+        if flow["deadline"].expired():
+            print(f"已到达整次运行的截止时间（{flow['deadline'].total_seconds} 秒），停止保活流程")
+            break
+        
+        if state in WORKSPACE_STATES:
+            if flow["workspace_started"] is None:
+                _enter_workspace(page, flow)
+            elif state != STATE_SERVING and flow["deadline"].phase_expired():
+                print(f"在工作区阶段的等待预算内未能启动服务器")
+                break
+            # 网络层已检测到预览就绪，直接跳到最后一个状态
+            if flow["preview"] and flow["preview"]["ready"] and state != STATE_SERVING:
+                flow["state"] = STATE_SERVING
+                continue
+        
+        print(f"[状态] {state}（已确认的检查点: {' -> '.join(flow['checkpoints']) or '无'}）")
+        try:
+            next_state = FLOW_STEPS[state](page, flow)
+        except Exception as e:
+            print(f"状态 {state} 执行出错: {e}")
+            next_state = None
+        
+        if next_state:
+            flow["checkpoints"].append(state)
+            flow["retries"][state] = 0
+            flow["state"] = next_state
+            continue
+        
+        flow["retries"][state] = flow["retries"].get(state, 0) + 1
+        if flow["retries"][state] <= MAX_STATE_RETRIES.get(state, 0):
+            print(f"状态 {state} 失败，从当前检查点重试（第{flow['retries'][state]}次）")
+            continue
+        
+        fallback = FALLBACK_STATES.get(state)
+        if fallback == STATE_WORKSPACE_LOADED and flow["refreshes"] >= flow["refresh_attempts"]:
+            print(f"已达到最大刷新次数({flow['refresh_attempts']})")
+            fallback = None
+        if fallback is None:
+            print(f"状态 {state} 多次失败，放弃本次保活")
+            break
+        print(f"状态 {state} 多次失败，退回到检查点 {fallback}")
+        flow["retries"][state] = 0
+        # 退回后该检查点之后确认过的状态都要重新确认
+        if fallback in flow["checkpoints"]:
+            del flow["checkpoints"][flow["checkpoints"].index(fallback):]
+        if fallback == STATE_WORKSPACE_LOADED:
+            flow["reload"] = True
+        elif fallback == STATE_AUTH:
+            # 重新认证后工作区阶段重新规划预算
+            flow["workspace_started"] = None
+        flow["state"] = fallback
+    
+    if flow["stop_watching"]:
+        flow["stop_watching"]()
+    # 进入过工作区却没能启动，记录一次失败供下次规划刷新间隔（被快速路径中止的不算）
+    if flow["workspace_started"] is not None and not flow["cold_start_recorded"] and not flow["cancelled"]:
+        record_cold_start_failure(flow["app_url"])
+    return flow["state"] == STATE_DONE
+
+def run(playwright: "Playwright", email, password, app_url, web_url, cookies_path, browser=None, saved_cookies=None,
+        deadline=None, refresh_attempts=5, keep_browser=False, cancel=None) -> dict:
+    """
+    浏览器流程，返回 {"status": RUN_SUCCESS/RUN_FAILED/RUN_CANCELLED, "login_path": 登录方式或None}
+    browser 和 saved_cookies 可由调用方预先准备好（见 keepalive_target() 中的并行启动）
+    keep_browser=True 时结束后不关闭 browser（由调用方在多个目标之间复用）
+    cancel() 返回True时中止流程（HTTP快速路径已成功），此时结果为 RUN_CANCELLED，不算失败
+    """
     context = None
     page = None
+    success = False
+    flow = None
+    traced = False
+    stop_capture = None
     
     try:
-        browser = playwright.firefox.launch(headless=True)
-        context = browser.new_context()
+        if browser is None:
+            browser = launch_browser(playwright, app_url)
+        context = new_context(browser, har_name("idx", app_url))
+        # 轻量录制trace，失败时连同出错页面的截图和HTML一起保存
+        traced = start_tracing(context)
+        # 记录触发工作区启动的请求，供下次HTTP快速路径重放
+        stop_capture = watch_start_requests(context, app_url)
         
-        # 尝试加载已保存的 cookies
+        # 尝试加载已保存的 cookies（记录读取时间，用于判断之后是否有其他进程刷新过）
+        cookies, cookies_checked_at = saved_cookies or read_cookies(cookies_path)
         cookies_loaded = False
-        if cookies_path.exists():
+        if cookies:
             try:
                 print("尝试使用已保存的 cookies 登录...")
-                with open(cookies_path, 'r') as f:
-                    cookies = json.load(f)
-                    context.add_cookies(cookies)
+                context.add_cookies(cookies)
                 cookies_loaded = True
             except Exception as e:
                 print(f"加载 cookies 失败: {e}")
@@ -252,223 +778,39 @@ def run(playwright: Playwright) -> None:
         
         page = context.new_page()
         
+        flow = {
+            "state": STATE_AUTH,
+            "deadline": deadline or Deadline(sum(seconds for _, seconds in RUN_PHASES), RUN_PHASES),
+            "checkpoints": [],
+            "retries": {},
+            "context": context,
+            "email": email,
+            "password": password,
+            "app_url": app_url,
+            "web_url": web_url,
+            "cookies_path": cookies_path,
+            "cookies_loaded": cookies_loaded,
+            "cookies_checked_at": cookies_checked_at,
+            "refresh_attempts": refresh_attempts,
+            "total_wait_time": 120,
+            "refresh_intervals": [],
+            "refreshes": 0,
+            "reload": False,
+            "workspace_started": None,
+            "cold_start_recorded": False,
+            "preview": None,
+            "stop_watching": None,
+            "cancel": cancel,
+            "cancelled": False,
+            "login_path": None,
+        }
+        
         try:
-            # 先访问目标页面，查看是否已登录
-            print(f"访问目标页面")
-            try:
-                page.goto(app_url, timeout=30000) 
-            except Exception as e:
-                print(f"页面加载超时: {e}")
-            
-            login_required = True
-            
-            # 检查是否需要登录 (通过页面URL判断)
-            current_url = page.url
-            if cookies_loaded:
-                try:
-                    # 检测登录状态：如果URL包含idx.google.com但不包含signin，则已登录成功
-                    if "idx.google.com" in current_url and "signin" not in current_url:
-                        print("已经通过cookies登录成功!")
-                        login_required = False
-
-                    else:
-                        print("Cookie登录失败，将尝试密码登录")
-                except Exception as e:
-                    print(f"判断登录状态失败: {e}，但将继续尝试密码登录")
-            
-            # 如果需要登录
-            if login_required:
-                print("开始密码登录流程...")
-                
-                # 确保在登录页面
-                if "signin" not in page.url:
-                    try:
-                        page.goto(app_url, timeout=60000)
-                    except Exception as e:
-                        print(f"跳转到登录页面失败: {e}，但将继续尝试")
-                    
-                    try:
-                        page.wait_for_load_state("domcontentloaded", timeout=60000)
-                        page.wait_for_load_state("networkidle", timeout=60000)
-                    except Exception as e:
-                        print(f"等待页面加载状态失败: {e}，但将继续执行")
-                
-                # 检查是否存在"Choose an account"页面
-                try:
-                    # 等待页面加载完成
-                    page.wait_for_load_state("domcontentloaded", timeout=10000)
-                    # 检查是否有"Choose an account"标题
-                    choose_account_visible = page.query_selector('text="Choose an account"')
-                    
-                    if choose_account_visible:
-                        print("检测到'Choose an account'页面，尝试选择账户...")
-                        
-                        # 尝试多种方法查找并点击包含用户邮箱的项目
-                        try:
-                            # 方法1: 直接通过邮箱文本查找
-                            email_account = page.get_by_text(email)
-                            if email_account:
-                                print(f"找到包含邮箱的账户，点击...")
-                                email_account.click()
-                                # 给页面一些时间响应点击
-                                page.wait_for_load_state("networkidle", timeout=10000)
-                            else:
-                                # 方法2: 通过div内容查找
-                                email_div = page.query_selector(f'div:has-text("{email}")')
-                                if email_div:
-                                    print(f"找到包含邮箱的div，点击...")
-                                    email_div.click()
-                                    page.wait_for_load_state("networkidle", timeout=10000)
-                                else:
-                                    # 方法3: 点击第一个账户选项
-                                    print("未找到匹配的邮箱账户，尝试点击第一个选项...")
-                                    first_account = page.query_selector('.OVnw0d')
-                                    if first_account:
-                                        first_account.click()
-                                        page.wait_for_load_state("networkidle", timeout=10000)
-                                    else:
-                                        print("无法找到任何账户选项，将继续尝试输入密码...")
-                        except Exception as e:
-                            print(f"选择账户失败: {e}，但将继续执行")
-                    else:
-                        print("没有检测到'Choose an account'页面，继续正常登录流程...")
-                        
-                        # 输入邮箱 - 使用try/except确保即使出错也继续
-                        try:
-                            print("输入邮箱...")
-                            try:
-                                email_field = page.get_by_label("Email or phone")
-                                email_field.fill(email)
-                            except Exception:
-                                # 尝试备用方法查找邮箱输入框
-                                try:
-                                    email_field = page.query_selector('input[type="email"]')
-                                    if email_field:
-                                        email_field.fill(email)
-                                    else:
-                                        print("无法找到邮箱输入框，但将继续执行")
-                                except Exception as e:
-                                    print(f"填写邮箱失败: {e}，但将继续执行")
-                            
-                            # 尝试点击下一步按钮
-                            try:
-                                next_button = page.get_by_role("button", name="Next")
-                                if next_button:
-                                    next_button.click()
-                                else:
-                                    # 尝试备用方法查找下一步按钮
-                                    next_button = page.query_selector('button[jsname="LgbsSe"]')
-                                    if next_button:
-                                        next_button.click()
-                                    else:
-                                        print("无法找到下一步按钮，但将继续执行")
-                            except Exception as e:
-                                print(f"点击下一步按钮失败: {e}，但将继续执行")
-                        except Exception as e:
-                            print(f"邮箱输入阶段失败: {e}，但将继续执行")
-                except Exception as e:
-                    print(f"检查'Choose an account'页面失败: {e}，继续常规登录流程")
-                
-                # 等待密码输入框出现
-                try:
-                    page.wait_for_selector('input[type="password"]', state="visible", timeout=20000)
-                    print("密码输入框已出现")
-                except Exception as e:
-                    print(f"等待密码输入框超时: {e}，但将继续尝试")
-                
-                # 输入密码
-                print("输入密码...")
-                try:
-                    password_field = page.get_by_label("Enter your password")
-                    if password_field:
-                        password_field.fill(password)
-                    else:
-                        # 尝试备用方法查找密码输入框
-                        password_field = page.query_selector('input[type="password"]')
-                        if password_field:
-                            password_field.fill(password)
-                        else:
-                            print("无法找到密码输入框，但将继续执行")
-                except Exception as e:
-                    print(f"填写密码失败: {e}，但将继续执行")
-                
-                # 尝试点击下一步按钮
-                try:
-                    next_button = page.get_by_role("button", name="Next")
-                    if next_button:
-                        next_button.click()
-                        print("提交密码")
-                        page.wait_for_timeout(5000)  # 等待5秒
-                    else:
-                        # 尝试备用方法查找下一步按钮
-                        next_button = page.query_selector('button[jsname="LgbsSe"]')
-                        if next_button:
-                            next_button.click()
-                        else:
-                            print("无法找到密码页面的下一步按钮，但将继续执行")
-                except Exception as e:
-                    print(f"点击密码页面的下一步按钮失败: {e}，但将继续执行")
-                
-                # 等待登录完成并跳转
-                try:
-                  page.goto(app_url, timeout=30000)
-                except Exception as e:
-                  print(f"跳转到目标页面失败: {e}，但将继续执行")
-                
-                # 使用与cookie登录相同的判断标准验证登录是否成功
-                current_url = page.url
-                if "idx.google.com" in current_url and "signin" not in current_url:
-                    print("密码登录成功!")
-                    
-                    # 保存cookies以便下次使用
-                    try:
-                        print("保存cookies以供下次使用...")
-                        cookies = context.cookies()
-                        with open(cookies_path, 'w') as f:
-                            json.dump(cookies, f)
-                    except Exception as e:
-                        print(f"保存cookies失败: {e}，但将继续执行")
-                else:
-                    print(f"登录可能不成功，当前URL: {current_url}，但将继续执行")
-            
-            # 无论是已登录还是刚登录，都跳转到目标URL
-            print(f"导航到目标页面")
-            try:
-                page.goto(app_url, timeout=30000)
-            except Exception as e:
-                print(f"跳转到目标页面失败: {e}，但将继续执行")
-            
-            # 最终验证是否成功访问目标URL
-            current_url = page.url
-            print(f"当前URL: {current_url}")
-            
-            # 使用统一的判断标准来验证最终访问是否成功
-            if "idx.google.com" in current_url and "signin" not in current_url:
-                # 最后再次保存cookies，确保获取最新状态
-                try:
-                    print("保存最终的cookies状态...")
-                    cookies = context.cookies()
-                    with open(cookies_path, 'w') as f:
-                        json.dump(cookies, f)
-                    print("Cookies保存成功!")
-                except Exception as e:
-                    print(f"保存最终cookies失败: {e}，但将继续执行")
-                
-                print("成功访问目标页面！")
-                
-                # 使用增强的等待和刷新函数，尝试找到Web按钮和Starting server文本
-                elements_found = refresh_page_and_wait(page, app_url, refresh_attempts=5, total_wait_time=120)
-                
-                if elements_found:
-                    print("成功点击Web按钮和Starting server文本，等待60秒后退出...")
-                    page.wait_for_timeout(60000)  # 等待60秒
-                else:
-                    print("在120秒内未能找到Web按钮和Starting server文本，但将继续等待")
-                
+            success = run_keepalive_flow(page, flow)
+            if success:
+                print("保活流程完成")
             else:
-                print(f"警告: 当前页面URL与目标URL不完全匹配")
-                print(f"登录可能部分成功或被重定向到其他页面，但脚本已完成执行")
-            
+                print(f"保活流程未完成，停在状态 {flow['state']}，已确认的检查点: {flow['checkpoints']}")
         except Exception as e:
             print(f"页面交互过程中发生错误: {e}")
             print(f"错误详情: {traceback.format_exc()}")
@@ -477,6 +819,11 @@ def run(playwright: Playwright) -> None:
         print(f"浏览器初始化过程中发生错误: {e}")
         print(f"错误详情: {traceback.format_exc()}")
     finally:
+        if stop_capture:
+            stop_capture()
+        if traced:
+            stop_tracing(context, failed=not success and not (flow and flow["cancelled"]), name=app_url)
+        
         # 优雅地关闭所有资源
         if page:
             try:
@@ -490,19 +837,154 @@ def run(playwright: Playwright) -> None:
             except Exception as e:
                 print(f"关闭上下文失败: {e}")
         
-        if browser:
+        if browser and not keep_browser:
             try:
                 browser.close()
             except Exception as e:
                 print(f"关闭浏览器失败: {e}")
         
         print("脚本执行完毕!")
+    if success:
+        status = RUN_SUCCESS
+    elif flow and flow["cancelled"]:
+        status = RUN_CANCELLED
+    else:
+        status = RUN_FAILED
+    return {"status": status, "login_path": flow["login_path"] if flow else None}
 
-if __name__ == "__main__":
+def keepalive_target(email, password, app_url, web_url, cookies_path, probe=False, playwright=None, browser=None) -> bool:
+    """
+    对单个工作区执行一次保活，返回是否成功；probe=True时只做低成本探测（熔断器半开状态）
+    playwright 和 browser 可由常驻的调用方（coordinator.py 的工作进程）提供，此时不启动也不关闭浏览器
+    """
+    # 整次运行的截止时间，各阶段的预算从中分配
+    run_budget = int(os.environ.get("RUN_BUDGET", sum(seconds for _, seconds in RUN_PHASES)))
+    refresh_attempts = 5
+    if probe:
+        run_budget = min(run_budget, int(os.environ.get("CIRCUIT_PROBE_BUDGET", "180")))
+        refresh_attempts = 1
+    deadline = Deadline(run_budget, RUN_PHASES)
     try:
+        return _keepalive_target(email, password, app_url, web_url, cookies_path, deadline, refresh_attempts,
+                                 playwright, browser)
+    finally:
+        metrics.observe_phases(deadline, target=app_url)
+
+def _keepalive_target(email, password, app_url, web_url, cookies_path, deadline, refresh_attempts,
+                      playwright=None, browser=None) -> bool:
+    """keepalive_target() 的主体；deadline由调用方创建，结束后统一统计各阶段耗时"""
+    deadline.start_phase("startup")
+    
+    # 目标已经正常运行则无事可做（只用标准库，不导入requests和Playwright）
+    if web_url and check_http_ok(web_url):
+        print("目标网站已返回200，无需操作")
+        return True
+    
+    # 流水线启动: HTTP快速路径和读取cookies放到后台线程，主线程同时启动浏览器并立即开始浏览器流程
+    # 快速路径成功则中止浏览器流程，关键路径耗时为 min(浏览器流程, 快速路径) 而不是先等快速路径再开始
+    executor = ThreadPoolExecutor(max_workers=2)
+    cookies_future = executor.submit(read_cookies, cookies_path)
+    fastpath_future = None
+    if os.environ.get("IDX_HTTP_FASTPATH", "1") == "1" and web_url:
+        verify_timeout = min(int(os.environ.get("IDX_HTTP_VERIFY_TIMEOUT", "30")), deadline.phase_remaining())
+        fastpath_future = executor.submit(http_keepalive, app_url, web_url, cookies_path, verify_timeout)
+    
+    def fastpath_succeeded(wait=False):
+        """快速路径是否已成功；wait=False 时尚未完成视为未成功"""
+        if fastpath_future is None or (not wait and not fastpath_future.done()):
+            return False
+        return bool(fastpath_future.result())
+    
+    def race(playwright, browser, keep_browser):
+        """浏览器流程与快速路径赛跑: 快速路径先成功则中止浏览器流程，浏览器流程失败时再等快速路径的结果"""
+        result = run(playwright, email, password, app_url, web_url, cookies_path,
+                     browser=browser, saved_cookies=cookies_future.result(), deadline=deadline,
+                     refresh_attempts=refresh_attempts, keep_browser=keep_browser,
+                     cancel=lambda: fastpath_succeeded())
+        # 每次保活只计一次登录方式: 浏览器流程成功时按其登录方式，快速路径胜出时记为http
+        if result["status"] == RUN_SUCCESS:
+            metrics.inc("keepalive_login_total", target=app_url, path=result["login_path"])
+            return True
+        if fastpath_succeeded(wait=True):
+            print("HTTP快速路径成功")
+            metrics.inc("keepalive_login_total", target=app_url, path="http")
+            return True
+        if result["login_path"]:
+            metrics.inc("keepalive_login_total", target=app_url, path=result["login_path"])
+        return False
+    
+    try:
+        if playwright is not None:
+            # 浏览器已由调用方启动，结束后保持浏览器运行供下一个目标使用
+            return race(playwright, browser, keep_browser=browser is not None)
+        
+        from playwright.sync_api import sync_playwright
         with sync_playwright() as playwright:
-            run(playwright)
+            browser = None
+            try:
+                print("预先启动浏览器...")
+                browser = launch_browser(playwright, app_url)
+            except Exception as e:
+                print(f"预先启动浏览器失败: {e}，稍后重试")
+            
+            if fastpath_succeeded():
+                print("HTTP快速路径已在浏览器启动期间成功，关闭浏览器")
+                metrics.inc("keepalive_login_total", target=app_url, path="http")
+                if browser:
+                    browser.close()
+                return True
+            return race(playwright, browser, keep_browser=False)
     except Exception as e:
+        if fastpath_succeeded(wait=True):
+            print("HTTP快速路径成功，无需浏览器")
+            metrics.inc("keepalive_login_total", target=app_url, path="http")
+            return True
         print(f"Playwright启动失败: {e}")
         print(f"错误详情: {traceback.format_exc()}")
         print("脚本终止")
+        return False
+    finally:
+        executor.shutdown(wait=False)
+
+def main() -> None:
+    # Get credentials from environment variables - format: "email password"
+    google_pw = os.environ.get("GOOGLE_PW", "")
+    credentials = google_pw.split(' ', 1) if google_pw else []
+    
+    email = credentials[0] if len(credentials) > 0 else None
+    password = credentials[1] if len(credentials) > 1 else None
+    
+    app_url = os.environ.get("APP_URL4", "https://idx.google.com/app-43646734")
+    web_url = os.environ.get("WEB_URL4", "")
+    cookies_path = Path("google_cookies.json")
+    
+    # Check if credentials are available
+    if not email or not password:
+        print("错误: 缺少凭据。请设置 GOOGLE_PW 环境变量，格式为 '账号 密码'。")
+        print("例如:")
+        print("  export GOOGLE_PW='your.email@gmail.com your_password'")
+        return
+    
+    process_target(email, password, app_url, web_url, cookies_path)
+
+def process_target(email, password, app_url, web_url, cookies_path, playwright=None, browser=None):
+    """经过熔断器处理单个工作区并记录指标，返回是否成功；熔断器断开而跳过时返回None"""
+    # 按目标熔断: 反复启动失败的工作区只在冷却结束后做低成本探测
+    allowed, circuit_state = check_circuit(app_url)
+    if not allowed:
+        return None
+    
+    metrics.inc("keepalive_runs_total", target=app_url)
+    try:
+        if keepalive_target(email, password, app_url, web_url, cookies_path, probe=circuit_state == HALF_OPEN,
+                            playwright=playwright, browser=browser):
+            metrics.inc("keepalive_success_total", target=app_url)
+            record_success(app_url)
+            return True
+        record_failure(app_url)
+        return False
+    finally:
+        metrics.flush()
+
+if __name__ == "__main__":
+    main()
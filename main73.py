@@ -2,15 +2,40 @@ import re
 import json
 import os
 from pathlib import Path
-from playwright.sync_api import Playwright, sync_playwright, expect
-import requests
 from datetime import datetime
+from typing import TYPE_CHECKING
+
+import metrics
+from browser_setup import har_name, launch_browser, new_context
+from deadline import Deadline, bounded_ms
+from nvair_api import ApiError, extend_simulation_api, load_cookies_file, session_from_cookies, simulation_id
+from tracing import capture_failure, start_tracing, stop_tracing
+
+# requests 和 Playwright 只在真正用到时才导入，减少启动时间
+if TYPE_CHECKING:
+    from playwright.sync_api import Playwright
 
 # 配置变量（优先读取环境变量，不存在则使用默认值）
 NVPW = os.getenv("NVPW", "xxx@ny.com xxxx")  # 格式: 账号 密码
 NVURL = os.getenv("NVURL", "https://air.nvidia.com/simulations/xxfcxxf-d3xx-4x1a-9ce1-233exxxfdfxx")
 COOKIES_FILE = os.getenv("COOKIES_FILE", "nvidia_cookies.json")
 TG_CONFIG = os.getenv("TG", "")  # 格式: ID TOKEN (一个空格)
+NV_ALL = os.getenv("NV_ALL", "") == "1"  # 为1时忽略NVURL，处理账号下的所有模拟
+NV_TABS = int(os.getenv("NV_TABS", "1"))  # 批量模式下同时打开的标签页数
+NV_API = os.getenv("NV_API", "") == "1"  # 为1时先通过接口增加时间，失败再操作页面
+
+SIMULATIONS_URL = "https://air.nvidia.com/simulations"
+SIMULATION_ID_PATTERN = re.compile(r"/simulations/([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})")
+MAX_ADD_TIME_ATTEMPTS = 15
+
+# 整次运行的阶段及名义预算（秒），总预算可通过 RUN_BUDGET 环境变量调整
+RUN_PHASES = [
+    ("login", 120),
+    ("extend", 180),
+]
+RUN_BUDGET = int(os.getenv("RUN_BUDGET", sum(seconds for _, seconds in RUN_PHASES)))
+# 批量模式下每个模拟单独的增加时间预算（秒），总耗时随模拟数量增长
+NV_SIM_BUDGET = int(os.getenv("NV_SIM_BUDGET", "90"))
 
 
 def send_tg_notification(message: str) -> None:
@@ -23,6 +48,8 @@ def send_tg_notification(message: str) -> None:
         print(f"TG_CONFIG 格式错误，应该是 'ID TOKEN'，当前值: {TG_CONFIG}")
         return
     
+    import requests
+    
     try:
         parts = TG_CONFIG.split(" ", 1)
         chat_id = parts[0].strip()
@@ -74,7 +101,7 @@ def load_cookies(context, filename=COOKIES_FILE) -> bool:
         return False
 
 
-def login_with_password(page, email, password) -> bool:
+def login_with_password(page, email, password, deadline=None) -> bool:
     """使用密码登陆"""
     try:
         page.goto("https://air.nvidia.com/login")
@@ -86,8 +113,8 @@ def login_with_password(page, email, password) -> bool:
         page.get_by_placeholder("Enter your password").click()
         page.get_by_placeholder("Enter your password").fill(password)
         page.get_by_role("button", name="Log In").click()
-        page.wait_for_timeout(30000)  # 等待30秒
-        page.wait_for_load_state("networkidle", timeout=10000)
+        page.wait_for_timeout(bounded_ms(deadline, 30000))  # 等待30秒
+        page.wait_for_load_state("networkidle", timeout=bounded_ms(deadline, 10000))
         
         # 检查是否登陆成功（跳转到simulations页面）
         if "simulations" in page.url:
@@ -101,11 +128,11 @@ def login_with_password(page, email, password) -> bool:
         return False
 
 
-def try_cookie_login(page) -> bool:
+def try_cookie_login(page, deadline=None) -> bool:
     """尝试使用cookie登陆"""
     try:
-        page.goto(NVURL)
-        page.wait_for_timeout(20000)  # 等待20秒
+        page.goto(SIMULATIONS_URL if NV_ALL else NVURL)
+        page.wait_for_timeout(bounded_ms(deadline, 20000))  # 等待20秒
         
         # 检查是否成功访问（如果被重定向到登陆页面则失败）
         if "login" in page.url or page.url == "https://air.nvidia.com/":
@@ -196,93 +223,38 @@ def check_time_status(page) -> tuple[bool, str]:
         return False, "检查失败"
 
 
-def run(playwright: Playwright) -> None:
-    # 解析账号和密码
-    credentials = NVPW.split(" ", 1)
-    email = credentials[0]
-    password = credentials[1]
-    
-    browser = playwright.firefox.launch(headless=True)
-    context = browser.new_context()
-    page = context.new_page()
-    
-    # 尝试使用cookie登陆
-    cookie_loaded = load_cookies(context)
-    
-    if cookie_loaded and try_cookie_login(page):
-        # Cookie登陆成功
-        login_success = True
-    else:
-        # Cookie登陆失败或不存在，使用密码登陆
-        page = context.new_page()  # 创建新页面清除状态
-        if login_with_password(page, email, password):
-            login_success = True
-            # 访问simulations确认登陆
-            page.goto("https://air.nvidia.com/simulations")
-            page.wait_for_load_state("networkidle", timeout=10000)
-            
-            # 判断并点击"Accept All"按钮（如果存在）
-            try:
-                accept_button = page.get_by_role("button", name="Accept All")
-                if accept_button.is_visible():
-                    accept_button.click()
-            except:
-                pass
-            
-            # 判断并点击"close"按钮（如果存在）
-            try:
-                close_button = page.get_by_role("button", name="close")
-                if close_button.is_visible():
-                    close_button.click()
-            except:
-                pass
-            
-            # 保存cookie
-            save_cookies(context)
-        else:
-            login_success = False
-    
-    if not login_success:
-        print("登陆失败，程序退出")
-        send_tg_notification(f"? NVIDIA Air 登陆失败\n时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        page.close()
-        context.close()
-        browser.close()
-        return
-    
-    # 访问指定模拟URL
-    page.goto(NVURL)
-    page.wait_for_load_state("networkidle", timeout=10000)
-    
+def extend_simulation(page, deadline) -> dict:
+    """在已打开的模拟页面上循环点击Add Time，直到时间达到最大值或尝试次数/预算用完"""
     # 检查初始时间状态
     print("\n=== 检查初始时间状态 ===")
     initial_success, initial_time = check_time_status(page)
     print(f"初始时间: {initial_time}")
+    result = {
+        "already_max": initial_success,
+        "time_added": initial_success,
+        "initial_time": initial_time,
+        "final_time": initial_time,  # 记录最终时间
+        "attempts": 0,
+    }
     
     if initial_success:
         print(f"? 初始检测: 时间已经是最大值 (6 days 23 hours 59 minutes)")
-        send_tg_notification(
-            f"? NVIDIA Air 登陆成功\n"
-            f"时间状态: 已是最大值\n"
-            f"初始时间: {initial_time}\n"
-            f"检测时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        )
-        page.close()
-        context.close()
-        browser.close()
-        return
+        return result
     
     print(f"初始时间未达到最大值，需要增加时间")
     
-    # 循环执行添加时间，最多尝试15次
-    max_attempts = 15
+    # 循环执行添加时间，最多尝试MAX_ADD_TIME_ATTEMPTS次
+    max_attempts = MAX_ADD_TIME_ATTEMPTS
     attempts = 0
     time_added = False
-    final_time = initial_time  # 记录最终时间
+    final_time = initial_time
     
     print(f"\n=== 开始尝试增加时间（最多{max_attempts}次）===")
     
     while attempts < max_attempts:
+        if deadline.phase_expired():
+            print(f"增加时间阶段的预算已用完，停止尝试")
+            break
         try:
             # 点击选项菜单
             page.locator("app-sim-timer app-options-menu").get_by_role("img").click()
@@ -313,7 +285,7 @@ def run(playwright: Playwright) -> None:
     # 达到最大尝试次数后，最后再检查一次
     if not time_added:
         print(f"\n=== 已达到最大尝试次数 ({max_attempts})，最后检查时间状态 ===")
-        page.wait_for_timeout(3000)  # 多等待一会儿
+        page.wait_for_timeout(deadline.timeout_ms(3000))  # 多等待一会儿
         final_success, final_time = check_time_status(page)
         
         if final_success:
@@ -322,38 +294,312 @@ def run(playwright: Playwright) -> None:
         else:
             print(f"? 最终检测: 时间未达到最大值 ({final_time})")
     
-    # 发送通知（无论成功失败都发送）
+    result.update(time_added=time_added, final_time=final_time, attempts=attempts)
+    return result
+
+
+def format_result_message(result) -> str:
+    """单个模拟的通知内容"""
     current_datetime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    if time_added:
-        notification_message = (
+    if result["already_max"]:
+        return (
+            f"? NVIDIA Air 登陆成功\n"
+            f"时间状态: 已是最大值\n"
+            f"初始时间: {result['initial_time']}\n"
+            f"检测时间: {current_datetime}"
+        )
+    if result["time_added"]:
+        return (
             f"✅ NVIDIA Air 时间增加成功\n"
             f"━━━━━━━━━━━━━━━━\n"
-            f"初始时间: {initial_time}\n"
-            f"增加后时间: {final_time}\n"
-            f"尝试次数: {attempts}/{max_attempts}\n"
+            f"初始时间: {result['initial_time']}\n"
+            f"增加后时间: {result['final_time']}\n"
+            f"尝试次数: {result['attempts']}/{MAX_ADD_TIME_ATTEMPTS}\n"
             f"执行时间: {current_datetime}"
         )
-        print(f"\n{notification_message}")
-        send_tg_notification(notification_message)
+    return (
+        f"✅ NVIDIA Air 时间未达到最大值\n"
+        f"━━━━━━━━━━━━━━━━\n"
+        f"初始时间: {result['initial_time']}\n"
+        f"当前时间: {result['final_time']}\n"
+        f"尝试次数: {result['attempts']}/{MAX_ADD_TIME_ATTEMPTS}\n"
+        f"建议: 请手动登录检查\n"
+        f"执行时间: {current_datetime}"
+    )
+
+
+def format_summary_message(results) -> str:
+    """批量模式下所有模拟的汇总通知"""
+    succeeded = sum(1 for result in results if result["time_added"])
+    lines = [
+        f"✅ NVIDIA Air 批量增加时间完成" if succeeded == len(results) else f"? NVIDIA Air 部分模拟未达到最大值",
+        f"━━━━━━━━━━━━━━━━",
+        f"模拟数量: {len(results)}，已达到最大值: {succeeded}",
+    ]
+    for result in results:
+        sim_id = result["url"].rstrip("/").rsplit("/", 1)[-1][:8]
+        if result["already_max"]:
+            status = "已是最大值"
+        elif result["time_added"]:
+            status = f"增加成功 ({result['final_time']})"
+        else:
+            status = f"未达到最大值 ({result['final_time']})"
+        lines.append(f"{sim_id}: {status}")
+    lines.append(f"执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    return "\n".join(lines)
+
+
+def discover_simulations(page, deadline) -> list:
+    """在simulations列表页枚举账号下所有模拟的URL"""
+    page.goto(SIMULATIONS_URL)
+    try:
+        page.wait_for_selector('a[href*="/simulations/"]', timeout=deadline.timeout_ms(15000))
+    except Exception as e:
+        print(f"等待模拟列表超时: {e}，尝试从页面内容中查找")
+    
+    candidates = []
+    try:
+        candidates += page.eval_on_selector_all('a[href*="/simulations/"]', "els => els.map(e => e.href)")
+    except Exception as e:
+        print(f"读取模拟链接失败: {e}")
+    # 列表行不一定是链接，再从页面内容中匹配模拟ID
+    candidates += re.findall(r'/simulations/[0-9a-fA-F-]{36}', page.content())
+    
+    sim_urls = []
+    for candidate in candidates:
+        match = SIMULATION_ID_PATTERN.search(candidate)
+        if match:
+            sim_url = f"{SIMULATIONS_URL}/{match.group(1)}"
+            if sim_url not in sim_urls:
+                sim_urls.append(sim_url)
+    print(f"找到 {len(sim_urls)} 个模拟")
+    return sim_urls
+
+
+def extend_via_api(cookies, sim_url, deadline):
+    """用登录会话的cookies直接调用接口增加时间，接口不可用时返回None，由页面操作兜底"""
+    try:
+        session = session_from_cookies(cookies)
+        return extend_simulation_api(session, simulation_id(sim_url), MAX_ADD_TIME_ATTEMPTS, deadline)
+    except ApiError as e:
+        print(f"[API] {e}，改用页面操作")
+        return None
+
+
+def simulation_deadline() -> Deadline:
+    """批量模式下单个模拟的预算，避免所有模拟共用一个 extend 阶段预算、排在后面的模拟直接超时"""
+    deadline = Deadline(NV_SIM_BUDGET, [("extend", NV_SIM_BUDGET)])
+    deadline.start_phase("extend")
+    return deadline
+
+
+def extend_all_simulations(context, sim_urls, tabs=1) -> list:
+    """
+    依次为每个模拟增加时间，每个模拟有自己的预算（NV_SIM_BUDGET）；tabs>1时每批同时打开多个标签页，
+    先让浏览器并行加载各页面，再逐个执行Add Time
+    启用NV_API时先逐个走接口，只有接口失败的模拟才打开页面
+    """
+    results = []
+    if NV_API:
+        cookies = context.cookies()
+        remaining_urls = []
+        for sim_url in sim_urls:
+            result = extend_via_api(cookies, sim_url, simulation_deadline())
+            if result is None:
+                remaining_urls.append(sim_url)
+            else:
+                result["url"] = sim_url
+                results.append(result)
+        sim_urls = remaining_urls
+    for start in range(0, len(sim_urls), max(tabs, 1)):
+        batch = []
+        for sim_url in sim_urls[start:start + max(tabs, 1)]:
+            tab = context.new_page()
+            try:
+                tab.goto(sim_url, wait_until="commit", timeout=30000)
+            except Exception as e:
+                print(f"打开模拟 {sim_url} 失败: {e}")
+            batch.append((sim_url, tab))
+        
+        for sim_url, tab in batch:
+            print(f"\n##### 模拟 {sim_url} #####")
+            deadline = simulation_deadline()
+            try:
+                tab.wait_for_load_state("networkidle", timeout=deadline.timeout_ms(10000))
+            except Exception as e:
+                print(f"等待模拟页面加载超时: {e}")
+            try:
+                result = extend_simulation(tab, deadline)
+            except Exception as e:
+                print(f"处理模拟 {sim_url} 出错: {e}")
+                result = {"already_max": False, "time_added": False, "initial_time": "检查失败",
+                          "final_time": "检查失败", "attempts": 0}
+            result["url"] = sim_url
+            results.append(result)
+            if not result["time_added"]:
+                capture_failure(tab, sim_url)
+            tab.close()
+    return results
+
+
+def record_result(result, sim_url) -> None:
+    """记录单个模拟的处理结果指标"""
+    metrics.inc("keepalive_runs_total", target=sim_url)
+    if result["time_added"]:
+        metrics.inc("keepalive_success_total", target=sim_url)
+    if result["attempts"]:
+        metrics.inc("keepalive_add_time_clicks_total", result["attempts"], target=sim_url, via=result.get("via", "ui"))
+
+
+def run(playwright: "Playwright") -> bool:
+    """执行一次登录和增加时间，返回是否全部成功；设置了 KEEPALIVE_RESULT_FILE 时把结果写入该文件（供工作队列等调用方读取）"""
+    # 整次运行的截止时间，各阶段的预算从中分配（本地单调时钟计时）
+    deadline = Deadline(RUN_BUDGET, RUN_PHASES)
+    success = False
+    try:
+        success = _run(playwright, deadline)
+        return success
+    finally:
+        metrics.observe_phases(deadline, target=SIMULATIONS_URL if NV_ALL else NVURL)
+        metrics.flush()
+        if os.getenv("KEEPALIVE_RESULT_FILE"):
+            with open(os.environ["KEEPALIVE_RESULT_FILE"], 'w') as f:
+                json.dump({"success": success}, f)
+
+
+def _run(playwright: "Playwright", deadline) -> bool:
+    # 解析账号和密码
+    credentials = NVPW.split(" ", 1)
+    email = credentials[0]
+    password = credentials[1]
+    
+    deadline.start_phase("login")
+    
+    # 单个模拟且已有cookies时，先直接调用接口，成功则无需启动浏览器
+    if NV_API and not NV_ALL:
+        cookies = load_cookies_file(COOKIES_FILE)
+        result = extend_via_api(cookies, NVURL, deadline) if cookies else None
+        if result is not None:
+            metrics.inc("keepalive_login_total", target=NVURL, path="api")
+            record_result(result, NVURL)
+            notification_message = format_result_message(result)
+            print(f"\n{notification_message}")
+            send_tg_notification(notification_message)
+            return result["time_added"]
+    
+    browser = launch_browser(playwright, SIMULATIONS_URL)
+    context = new_context(browser, har_name("nvair", SIMULATIONS_URL if NV_ALL else NVURL))
+    # 轻量录制trace，失败时连同出错页面的截图和HTML一起保存
+    traced = start_tracing(context)
+    success = False
+    try:
+        success = _run_in_context(context, email, password, deadline)
+        return success
+    finally:
+        if traced:
+            stop_tracing(context, failed=not success, name=SIMULATIONS_URL if NV_ALL else NVURL)
+        context.close()
+        browser.close()
+
+
+def _run_in_context(context, email, password, deadline) -> bool:
+    """登录并为模拟增加时间，返回是否全部成功"""
+    page = context.new_page()
+    
+    # 尝试使用cookie登陆
+    cookie_loaded = load_cookies(context)
+    
+    if cookie_loaded and try_cookie_login(page, deadline):
+        # Cookie登陆成功
+        login_success = True
+        login_path = "cookies"
     else:
-        notification_message = (
-            f"✅ NVIDIA Air 时间未达到最大值\n"
-            f"━━━━━━━━━━━━━━━━\n"
-            f"初始时间: {initial_time}\n"
-            f"当前时间: {final_time}\n"
-            f"尝试次数: {attempts}/{max_attempts}\n"
-            f"建议: 请手动登录检查\n"
-            f"执行时间: {current_datetime}"
-        )
+        # Cookie登陆失败或不存在，使用密码登陆
+        page.close()
+        page = context.new_page()  # 创建新页面清除状态
+        if login_with_password(page, email, password, deadline):
+            login_success = True
+            login_path = "password"
+            # 访问simulations确认登陆
+            page.goto(SIMULATIONS_URL)
+            try:
+                page.wait_for_load_state("networkidle", timeout=deadline.timeout_ms(10000))
+            except Exception as e:
+                print(f"等待simulations页面加载超时: {e}")
+            
+            # 判断并点击"Accept All"按钮（如果存在）
+            try:
+                accept_button = page.get_by_role("button", name="Accept All")
+                if accept_button.is_visible():
+                    accept_button.click()
+            except:
+                pass
+            
+            # 判断并点击"close"按钮（如果存在）
+            try:
+                close_button = page.get_by_role("button", name="close")
+                if close_button.is_visible():
+                    close_button.click()
+            except:
+                pass
+            
+            # 保存cookie
+            save_cookies(context)
+        else:
+            login_success = False
+    
+    login_target = SIMULATIONS_URL if NV_ALL else NVURL
+    if not login_success:
+        metrics.inc("keepalive_login_total", target=login_target, path="failed")
+        metrics.inc("keepalive_runs_total", target=login_target)
+        print("登陆失败，程序退出")
+        send_tg_notification(f"? NVIDIA Air 登陆失败\n时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        capture_failure(page, login_target)
+        page.close()
+        return False
+    
+    metrics.inc("keepalive_login_total", target=login_target, path=login_path)
+    deadline.start_phase("extend")
+    
+    success = False
+    if NV_ALL:
+        # 批量模式: 一次登录后为账号下所有模拟增加时间
+        sim_urls = discover_simulations(page, deadline)
+        if not sim_urls:
+            send_tg_notification(f"? NVIDIA Air 未找到任何模拟\n时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        else:
+            results = extend_all_simulations(context, sim_urls, tabs=NV_TABS)
+            for result in results:
+                record_result(result, result["url"])
+            notification_message = format_summary_message(results)
+            print(f"\n{notification_message}")
+            send_tg_notification(notification_message)
+            success = all(result["time_added"] for result in results)
+    else:
+        result = extend_via_api(context.cookies(), NVURL, deadline) if NV_API else None
+        if result is None:
+            # 访问指定模拟URL
+            page.goto(NVURL)
+            try:
+                page.wait_for_load_state("networkidle", timeout=deadline.timeout_ms(10000))
+            except Exception as e:
+                print(f"等待模拟页面加载超时: {e}")
+            result = extend_simulation(page, deadline)
+        
+        record_result(result, NVURL)
+        # 发送通知（无论成功失败都发送）
+        notification_message = format_result_message(result)
         print(f"\n{notification_message}")
         send_tg_notification(notification_message)
+        success = result["time_added"]
+        if not success:
+            capture_failure(page, NVURL)
     
     page.close()
-    context.close()
-    browser.close()
+    return success
 
 
 if __name__ == "__main__":
+    from playwright.sync_api import sync_playwright
     with sync_playwright() as playwright:
         run(playwright)
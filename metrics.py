@@ -0,0 +1,183 @@
+"""
+Prometheus格式的保活指标
+
+每次运行在内存中累加计数器和直方图，结束时调用 flush() 合并到持久化状态
+（.keepalive_state/metrics.json，随状态目录缓存跨运行累积），并写出 textfile collector
+可读取的 .prom 文件。常驻模式下 `python metrics.py --serve 9101` 提供 HTTP /metrics。
+"""
+import os
+import threading
+
+from keepalive_state import STATE_DIR, load_state, save_state, state_lock
+
+METRICS_FILE = "metrics.json"
+# node_exporter textfile collector 读取的文件，默认写在状态目录中
+TEXTFILE_PATH = os.getenv("METRICS_TEXTFILE", str(STATE_DIR / "keepalive.prom"))
+
+# 直方图分桶（秒）
+DEFAULT_BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 600)
+
+# 指标名 -> (类型, 说明)
+METRICS = {
+    "keepalive_runs_total": ("counter", "Keepalive runs started"),
+    "keepalive_success_total": ("counter", "Keepalive runs that succeeded"),
+    "keepalive_login_total": ("counter", "Logins by path (http, cookies, shared, password, failed)"),
+    "keepalive_try_again_clicks_total": ("counter", "Try Again buttons clicked"),
+    "keepalive_add_time_clicks_total": ("counter", "NVIDIA Air Add Time actions, by UI or API"),
+    "keepalive_phase_duration_seconds": ("histogram", "Time spent in each run phase"),
+    "keepalive_asset_cache_requests_total": ("counter", "Static asset requests by cache result (hit, revalidated, miss)"),
+    "keepalive_asset_cache_bytes_total": ("counter", "Static asset bytes served, by source (cache, network)"),
+    "keepalive_browser_launch_seconds": ("histogram", "Time to launch the browser"),
+}
+
+_lock = threading.Lock()
+# 本进程尚未flush的增量
+_counters = {}
+_histograms = {}
+
+
+def _label_key(labels) -> str:
+    """把标签渲染成Prometheus格式，同时作为存储的键"""
+    parts = []
+    for name, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return ",".join(parts)
+
+
+def inc(name, amount=1, **labels) -> None:
+    """计数器加 amount"""
+    key = _label_key(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + amount
+
+
+def observe(name, value, **labels) -> None:
+    """直方图记录一个观测值"""
+    key = _label_key(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        entry = series.setdefault(key, {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                entry["buckets"][i] += 1
+        entry["sum"] += value
+        entry["count"] += 1
+
+
+def observe_phases(deadline, **labels) -> None:
+    """把Deadline记录的各阶段耗时写入直方图"""
+    for phase, seconds in deadline.phase_durations():
+        observe("keepalive_phase_duration_seconds", seconds, phase=phase, **labels)
+
+
+def flush() -> None:
+    """把本进程的增量合并到持久化状态并写出textfile；出错只打印，不影响保活结果"""
+    global _counters, _histograms
+    with _lock:
+        counters, histograms = _counters, _histograms
+        _counters, _histograms = {}, {}
+    if not counters and not histograms:
+        return
+    try:
+        with state_lock("metrics"):
+            state = load_state(METRICS_FILE, {}) or {}
+            stored_counters = state.setdefault("counters", {})
+            for name, series in counters.items():
+                stored = stored_counters.setdefault(name, {})
+                for key, value in series.items():
+                    stored[key] = stored.get(key, 0) + value
+            stored_histograms = state.setdefault("histograms", {})
+            for name, series in histograms.items():
+                stored = stored_histograms.setdefault(name, {})
+                for key, entry in series.items():
+                    total = stored.setdefault(key, {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0})
+                    total["buckets"] = [a + b for a, b in zip(total["buckets"], entry["buckets"])]
+                    total["sum"] += entry["sum"]
+                    total["count"] += entry["count"]
+            save_state(METRICS_FILE, state)
+            write_textfile(state)
+    except Exception as e:
+        print(f"保存指标失败: {e}")
+
+
+def render(state) -> str:
+    """把持久化状态渲染成Prometheus文本格式"""
+    lines = []
+    counters = state.get("counters", {})
+    histograms = state.get("histograms", {})
+    for name, (kind, help_text) in METRICS.items():
+        series = counters.get(name) if kind == "counter" else histograms.get(name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(series.items()):
+            if kind == "counter":
+                lines.append(f"{name}{{{key}}} {value}" if key else f"{name} {value}")
+                continue
+            prefix = f"{key}," if key else ""
+            for bound, count in zip(DEFAULT_BUCKETS, value["buckets"]):
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {value["count"]}')
+            suffix = f"{{{key}}}" if key else ""
+            lines.append(f"{name}_sum{suffix} {round(value['sum'], 3)}")
+            lines.append(f"{name}_count{suffix} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(state) -> None:
+    """原子地写出 .prom 文件，避免collector读到写了一半的内容"""
+    tmp_path = f"{TEXTFILE_PATH}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(TEXTFILE_PATH) or ".", exist_ok=True)
+    with open(tmp_path, 'w') as f:
+        f.write(render(state))
+    os.replace(tmp_path, TEXTFILE_PATH)
+
+
+def start_server(port, host="0.0.0.0"):
+    """在后台线程中提供 /metrics，返回server（http.server在这里才导入，不拖慢普通运行的启动）"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            # 每次抓取时重新读取持久化状态，包含其他进程flush的数据
+            body = render(load_state(METRICS_FILE, {}) or {}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"指标服务已启动: http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="保活指标")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="常驻提供 HTTP /metrics")
+    args = parser.parse_args()
+    if args.serve is None:
+        print(render(load_state(METRICS_FILE, {}) or {}), end="")
+        return
+    server = start_server(args.serve)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import re
+import json
+from datetime import datetime, timedelta, timezone
+
+from idx_http import USER_AGENT
+
+# NVIDIA Air 网页端使用的REST接口；本地测试时可指向 nvair_standin.py
+API_BASE = os.getenv("NVAIR_API_BASE", "https://air.nvidia.com/api/v1").rstrip("/")
+API_TIMEOUT = float(os.getenv("NVAIR_API_TIMEOUT", "15"))
+# 每次extend之后剩余时间的上限：7天，剩余不少于 6 days 23 hours 59 minutes 即视为已达最大值
+MAX_REMAINING = timedelta(days=7)
+MAX_TOLERANCE = timedelta(minutes=2)
+MAX_EXTEND_CALLS = 15
+
+SIMULATION_ID_PATTERN = re.compile(r"([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})")
+
+
+class ApiError(Exception):
+    """接口不可用或返回了无法识别的内容，调用方应回退到UI流程"""
+
+
+def simulation_id(sim_url) -> str:
+    """从模拟URL中取出模拟ID"""
+    match = SIMULATION_ID_PATTERN.search(sim_url)
+    if not match:
+        raise ApiError(f"无法从 {sim_url} 中解析模拟ID")
+    return match.group(1)
+
+
+def session_from_cookies(cookies):
+    """用Playwright格式的cookies（context.cookies()或cookies文件内容）构造已登录的requests会话"""
+    import requests
+
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    session.headers["Accept"] = "application/json"
+    for cookie in cookies:
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain", ""),
+            path=cookie.get("path", "/"),
+        )
+    # 会话认证的写接口需要CSRF token，与网页端一样从cookie中取
+    csrf_token = session.cookies.get("csrftoken")
+    if csrf_token:
+        session.headers["X-CSRFToken"] = csrf_token
+    return session
+
+
+def load_cookies_file(cookies_path):
+    """读取cookies文件，不存在或损坏时返回None"""
+    try:
+        with open(cookies_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[API] 读取cookies文件失败: {e}")
+        return None
+
+
+def _request(session, method, path, **kwargs):
+    url = f"{API_BASE}/{path.lstrip('/')}"
+    try:
+        response = session.request(method, url, timeout=API_TIMEOUT, allow_redirects=False, **kwargs)
+    except Exception as e:
+        raise ApiError(f"请求 {url} 失败: {e}")
+    if response.status_code in (401, 403) or response.is_redirect:
+        raise ApiError(f"{url} 返回 HTTP {response.status_code}，会话未登录或已失效")
+    if response.status_code >= 400:
+        raise ApiError(f"{url} 返回 HTTP {response.status_code}")
+    try:
+        return response.json()
+    except ValueError:
+        raise ApiError(f"{url} 返回的不是JSON")
+
+
+def _parse_time(value) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except Exception:
+        raise ApiError(f"无法解析过期时间: {value!r}")
+    # 没有时区的时间按UTC处理
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def get_expiry(session, sim_id) -> datetime:
+    """读取模拟的过期时间"""
+    data = _request(session, "GET", f"simulation/{sim_id}/")
+    if not data.get("expires_at"):
+        raise ApiError(f"模拟 {sim_id} 的返回中没有 expires_at")
+    return _parse_time(data["expires_at"])
+
+
+def format_remaining(expires_at) -> str:
+    """把过期时间换算成与页面一致的剩余时间文本"""
+    remaining = max(expires_at - datetime.now(timezone.utc), timedelta(0))
+    minutes = int(remaining.total_seconds() // 60)
+    return f"{minutes // 1440} days {minutes % 1440 // 60} hours {minutes % 60} minutes"
+
+
+def is_max(expires_at) -> bool:
+    """剩余时间是否已达到最大值"""
+    return expires_at - datetime.now(timezone.utc) >= MAX_REMAINING - MAX_TOLERANCE
+
+
+def extend_simulation_api(session, sim_id, max_calls=MAX_EXTEND_CALLS, deadline=None) -> dict:
+    """
+    通过接口为模拟增加时间，直到剩余时间达到最大值、过期时间不再变化或次数用完
+    返回与UI流程相同结构的结果；接口不可用时抛出ApiError
+    """
+    expires_at = get_expiry(session, sim_id)
+    initial_time = format_remaining(expires_at)
+    already_max = is_max(expires_at)
+    print(f"[API] 模拟 {sim_id[:8]} 初始时间: {initial_time}")
+    result = {
+        "already_max": already_max,
+        "time_added": already_max,
+        "initial_time": initial_time,
+        "final_time": initial_time,
+        "attempts": 0,
+        "via": "api",
+    }
+    if result["already_max"]:
+        return result
+
+    while result["attempts"] < max_calls and not (deadline and deadline.phase_expired()):
+        _request(session, "POST", f"simulation/{sim_id}/control/", json={"action": "extend"})
+        result["attempts"] += 1
+        previous, expires_at = expires_at, get_expiry(session, sim_id)
+        result["final_time"] = format_remaining(expires_at)
+        print(f"[API] 第 {result['attempts']} 次extend后: {result['final_time']}")
+        if is_max(expires_at):
+            result["time_added"] = True
+            break
+        if expires_at <= previous:
+            print(f"[API] 过期时间没有变化，停止extend")
+            break
+    return result
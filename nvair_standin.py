@@ -0,0 +1,203 @@
+"""
+NVIDIA Air 接口的本地替身，用于在不访问真实服务的情况下测试 nvair_api.py
+
+提供与网页端相同路径的两个接口：
+  GET  /api/v1/simulation/<id>/          返回 {"id", "expires_at", ...}
+  POST /api/v1/simulation/<id>/control/  {"action": "extend"} 增加时间，最多到7天
+
+请求必须带 sessionid cookie；POST 还必须带与 csrftoken cookie 一致的 X-CSRFToken 头。
+
+另外提供网页端的两个页面，供 main6.py 的页面流程使用（配合
+STANDIN_HOSTS='{"air.nvidia.com": "<替身地址>"}'，页面URL仍为 air.nvidia.com）：
+  GET  /simulations          模拟列表，每个模拟一个链接
+  GET  /simulations/<id>     模拟页面，app-sim-timer 显示剩余时间，选项菜单中的 "Add Time" 调用上面的接口
+
+用法: python nvair_standin.py [--port 8090] [--sim ID[=剩余小时]] [--step-hours 24]
+然后设置 NVAIR_API_BASE=http://127.0.0.1:8090/api/v1
+"""
+import argparse
+import json
+import re
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_REMAINING = timedelta(days=7)
+SESSION_ID = "standin-session"
+CSRF_TOKEN = "standin-csrf"
+
+PATH_PATTERN = re.compile(r"^/api/v1/simulation/([0-9a-fA-F-]{36})/(control/)?$")
+PAGE_PATTERN = re.compile(r"^/simulations(?:/([0-9a-fA-F-]{36}))?/?$")
+
+LIST_PAGE = """<!doctype html>
+<html><body><h1>Simulations</h1><ul>%s</ul></body></html>
+"""
+SIMULATION_PAGE = """<!doctype html>
+<html><body>
+  <app-sim-timer>
+    <span id="timer">loading</span>
+    <app-options-menu><img alt="options" width="16" height="16"
+      src="data:image/svg+xml,%%3Csvg xmlns='http://www.w3.org/2000/svg' width='16' height='16'/%%3E"></app-options-menu>
+  </app-sim-timer>
+  <div id="menu" hidden><div id="add-time">Add Time</div></div>
+  <script>
+    const api = '/api/v1/simulation/%s/';
+    const csrf = () => (document.cookie.match(/csrftoken=([^;]+)/) || [])[1] || '';
+    const format = (expires) => {
+      const minutes = Math.max(0, Math.floor((new Date(expires) - Date.now()) / 60000));
+      return `${Math.floor(minutes / 1440)} days ${Math.floor(minutes %% 1440 / 60)} hours ${minutes %% 60} minutes`;
+    };
+    const refresh = async () => {
+      const response = await fetch(api);
+      document.getElementById('timer').textContent = format((await response.json()).expires_at);
+    };
+    document.querySelector('app-options-menu img').onclick = () => { document.getElementById('menu').hidden = false; };
+    document.getElementById('add-time').onclick = async () => {
+      document.getElementById('menu').hidden = true;
+      await fetch(api + 'control/', {method: 'POST', headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrf()},
+                                     body: JSON.stringify({action: 'extend'})});
+      await refresh();
+    };
+    refresh();
+  </script>
+</body></html>
+"""
+
+
+def make_handler(simulations, step, lock):
+    """生成绑定了模拟数据的请求处理类"""
+
+    class StandinHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _cookies(self):
+            cookie = SimpleCookie(self.headers.get("Cookie", ""))
+            return {name: morsel.value for name, morsel in cookie.items()}
+
+        def _simulation(self):
+            """校验会话并返回 (模拟ID, 是否为control路径)，失败时已写好响应"""
+            if self._cookies().get("sessionid") != SESSION_ID:
+                self._send_json(403, {"detail": "Authentication credentials were not provided."})
+                return None, False
+            match = PATH_PATTERN.match(self.path)
+            if not match or match.group(1) not in simulations:
+                self._send_json(404, {"detail": "Not found."})
+                return None, False
+            return match.group(1), bool(match.group(2))
+
+        def _send_page(self, body):
+            body = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            page = PAGE_PATTERN.match(self.path.split("?")[0])
+            if page:
+                if page.group(1) is None:
+                    links = "".join(f'<li><a href="/simulations/{sim_id}">{sim_id}</a></li>' for sim_id in simulations)
+                    self._send_page(LIST_PAGE % links)
+                elif page.group(1) in simulations:
+                    self._send_page(SIMULATION_PAGE % page.group(1))
+                else:
+                    self._send_json(404, {"detail": "Not found."})
+                return
+            sim_id, is_control = self._simulation()
+            if not sim_id:
+                return
+            if is_control:
+                self._send_json(405, {"detail": "Method not allowed."})
+                return
+            with lock:
+                expires_at = simulations[sim_id]
+            self._send_json(200, {"id": sim_id, "state": "LOADED", "expires_at": expires_at.isoformat()})
+
+        def do_POST(self):
+            sim_id, is_control = self._simulation()
+            if not sim_id:
+                return
+            if not is_control:
+                self._send_json(405, {"detail": "Method not allowed."})
+                return
+            if self.headers.get("X-CSRFToken") != self._cookies().get("csrftoken"):
+                self._send_json(403, {"detail": "CSRF Failed."})
+                return
+            length = int(self.headers.get("Content-Length", "0"))
+            try:
+                action = json.loads(self.rfile.read(length) or b"{}").get("action")
+            except ValueError:
+                action = None
+            if action != "extend":
+                self._send_json(400, {"detail": f"Unsupported action: {action}"})
+                return
+            with lock:
+                limit = datetime.now(timezone.utc) + MAX_REMAINING
+                simulations[sim_id] = min(simulations[sim_id] + step, limit)
+            self._send_json(200, {"result": "success"})
+
+        def log_message(self, format, *args):
+            print(f"[替身] {self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+    return StandinHandler
+
+
+def start_standin(simulations, port=0, step_hours=24):
+    """
+    在后台线程中启动替身服务，simulations 为 {模拟ID: 剩余小时数}
+    返回 (server, api_base)
+    """
+    now = datetime.now(timezone.utc)
+    state = {sim_id: now + timedelta(hours=hours) for sim_id, hours in simulations.items()}
+    handler = make_handler(state, timedelta(hours=step_hours), threading.Lock())
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/v1"
+
+
+def standin_cookies(domain="127.0.0.1"):
+    """替身服务认可的Playwright格式cookies；通过 STANDIN_HOSTS 转发页面时 domain 用 air.nvidia.com"""
+    return [
+        {"name": "sessionid", "value": SESSION_ID, "domain": domain, "path": "/"},
+        {"name": "csrftoken", "value": CSRF_TOKEN, "domain": domain, "path": "/"},
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NVIDIA Air 接口的本地替身")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--sim", action="append", default=[], help="模拟ID[=剩余小时]，可重复")
+    parser.add_argument("--step-hours", type=float, default=24, help="每次extend增加的小时数")
+    parser.add_argument("--cookies", help="把替身认可的cookies写入该文件")
+    args = parser.parse_args()
+
+    simulations = {}
+    for spec in args.sim or [str(uuid.uuid4())]:
+        sim_id, _, hours = spec.partition("=")
+        simulations[sim_id] = float(hours or 1)
+    if args.cookies:
+        with open(args.cookies, 'w') as f:
+            json.dump(standin_cookies(), f, indent=2)
+        print(f"Cookie已保存到 {args.cookies}")
+
+    server, api_base = start_standin(simulations, port=args.port, step_hours=args.step_hours)
+    print(f"NVAIR_API_BASE={api_base}")
+    for sim_id, hours in simulations.items():
+        print(f"模拟 {sim_id}: 剩余 {hours} 小时")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+按一致性哈希把目标列表分给N个工作进程，输出第 index 个工作进程负责的目标行
+
+每个工作进程在哈希环上占 --vnodes 个虚拟节点，目标按 targets.py 中的 key 落到顺时针方向的第一个节点。
+分配只取决于目标和工作进程数，各工作进程独立计算即可得到互不重叠的分片；
+增减一个工作进程时只有约 1/N 的目标换到别的工作进程，其余目标的cookies和缓存仍在原来的工作进程上。
+
+用法:
+  python shard.py --index 0 --count 3 targets.txt          输出分片中的目标行
+  python shard.py --index 0 --count 3 targets.txt --run    依次执行分片中的目标
+
+在 GitHub Actions 中可配合 matrix 使用:
+  strategy: {matrix: {index: [0, 1, 2]}}
+  run: python shard.py --index ${{ matrix.index }} --count 3 targets.txt --run
+"""
+import argparse
+import bisect
+import hashlib
+
+from targets import parse_target, run_target
+
+VNODES = 100
+
+
+def _hash(value) -> int:
+    # 用固定的哈希函数，保证不同机器、不同Python进程的结果一致（内置hash()每个进程随机）
+    return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], "big")
+
+
+def build_ring(count, vnodes=VNODES) -> list:
+    """返回按哈希值排序的 [(哈希值, 工作进程序号)]"""
+    return sorted((_hash(f"worker-{worker}#{vnode}"), worker) for worker in range(count) for vnode in range(vnodes))
+
+
+def owner(ring, key) -> int:
+    """目标所属的工作进程序号"""
+    position = bisect.bisect(ring, (_hash(key),))
+    return ring[position % len(ring)][1]
+
+
+def shard_lines(lines, index, count, vnodes=VNODES) -> list:
+    """返回属于第 index 个工作进程的 (原始行, 目标)"""
+    ring = build_ring(count, vnodes)
+    selected = {}
+    for line in lines:
+        target = parse_target(line)
+        # 重复的目标只保留第一个
+        if target and target["key"] not in selected and owner(ring, target["key"]) == index:
+            selected[target["key"]] = (line.strip(), target)
+    return list(selected.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按一致性哈希选出工作进程负责的目标")
+    parser.add_argument("targets", help="目标列表文件，格式见 targets.py")
+    parser.add_argument("--index", type=int, required=True, help="工作进程序号，从0开始")
+    parser.add_argument("--count", type=int, required=True, help="工作进程总数")
+    parser.add_argument("--vnodes", type=int, default=VNODES, help="每个工作进程的虚拟节点数")
+    parser.add_argument("--run", action="store_true", help="依次执行分片中的目标")
+    args = parser.parse_args()
+    if not 0 <= args.index < args.count:
+        parser.error("--index 必须在 0 到 count-1 之间")
+
+    with open(args.targets, 'r') as f:
+        selected = shard_lines(f, args.index, args.count, args.vnodes)
+
+    if not args.run:
+        for line, _ in selected:
+            print(line)
+        return
+
+    print(f"工作进程 {args.index}/{args.count} 负责 {len(selected)} 个目标")
+    failed = 0
+    for _, target in selected:
+        print(f"\n处理 {target['key']}")
+        if not run_target(target):
+            failed += 1
+    print(f"\n完成 {len(selected) - failed}/{len(selected)} 个目标")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+目标列表：多个工作区/模拟写在一个文件里，由工作队列等统一调度
+
+每行一个目标，# 开头为注释:
+  idx   <APP_URL> [WEB_URL] [pw=环境变量名] [cookies=文件]
+  nvair <模拟URL|all> [pw=环境变量名] [cookies=文件]
+
+pw 指定保存凭据（"账号 密码"）的环境变量，默认 IDX 为 GOOGLE_PW、NVIDIA Air 为 NVPW；
+cookies 默认 IDX 为 google_cookies.json、NVIDIA Air 为 nvidia_cookies.json；
+指定了其他 pw 时默认文件名带上环境变量名（如 google_cookies.GOOGLE_PW2.json），不同账号不会共用同一个cookies文件。
+nvair 的URL写 all 时处理账号下的所有模拟（NV_ALL=1）。
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+KINDS = {
+    "idx": {"pw": "GOOGLE_PW", "cookies": "google_cookies.json"},
+    "nvair": {"pw": "NVPW", "cookies": "nvidia_cookies.json"},
+}
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+
+def parse_target(line) -> dict:
+    """解析一行目标，空行和注释返回None，格式错误时抛出 ValueError"""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    kind, *fields = line.split()
+    options = dict(field.split("=", 1) for field in fields if field.startswith(("pw=", "cookies=")))
+    urls = [field for field in fields if not field.startswith(("pw=", "cookies="))]
+    if kind not in KINDS or not urls:
+        raise ValueError(f"无法解析的目标: {line}")
+    pw_env = options.get("pw", KINDS[kind]["pw"])
+    cookies = KINDS[kind]["cookies"]
+    if pw_env != KINDS[kind]["pw"]:
+        cookies = cookies.replace(".json", f".{pw_env}.json")
+    target = {
+        "kind": kind,
+        "url": urls[0],
+        "web_url": urls[1] if kind == "idx" and len(urls) > 1 else "",
+        "pw_env": pw_env,
+        "cookies": options.get("cookies", cookies),
+    }
+    # 同一个目标只会有一个任务（nvair all 按凭据区分账号）
+    target["key"] = f"{kind}:{target['url']}" if target["url"] != "all" else f"{kind}:all:{target['pw_env']}"
+    return target
+
+
+def load_targets(path) -> list:
+    """读取目标列表文件，重复的目标只保留第一个"""
+    targets = {}
+    with open(path, 'r') as f:
+        for number, line in enumerate(f, 1):
+            try:
+                target = parse_target(line)
+            except ValueError as e:
+                raise ValueError(f"{path} 第{number}行: {e}") from None
+            if target and target["key"] not in targets:
+                targets[target["key"]] = target
+    return list(targets.values())
+
+
+def run_target(target, playwright=None, browser=None) -> bool:
+    """
+    执行一个目标的保活，返回是否成功（熔断器跳过也视为完成）
+    IDX 目标可复用调用方的 playwright 和 browser（见 coordinator.py），执行后不关闭
+    """
+    credentials = os.getenv(target["pw_env"], "").split(' ', 1)
+    if len(credentials) < 2:
+        print(f"错误: 环境变量 {target['pw_env']} 中没有凭据，跳过 {target['key']}")
+        return False
+
+    if target["kind"] == "idx":
+        # IDX 在当前进程中执行（main.py 的环境变量只在 main() 中读取）
+        import main
+        return main.process_target(credentials[0], credentials[1], target["url"], target["web_url"],
+                                   Path(target["cookies"]), playwright, browser) is not False
+
+    # NVIDIA Air 的配置在模块导入时读取，用子进程执行 main6.py，结果通过 KEEPALIVE_RESULT_FILE 返回
+    fd, result_file = tempfile.mkstemp(prefix="keepalive_result_", suffix=".json")
+    os.close(fd)
+    env = dict(os.environ, NVPW=os.environ[target["pw_env"]], COOKIES_FILE=target["cookies"],
+               NV_ALL="1" if target["url"] == "all" else "0", KEEPALIVE_RESULT_FILE=result_file)
+    if target["url"] != "all":
+        env["NVURL"] = target["url"]
+    try:
+        subprocess.run([sys.executable, str(SCRIPT_DIR / "main6.py")], env=env)
+        with open(result_file, 'r') as f:
+            return bool(json.load(f).get("success"))
+    except (OSError, ValueError) as e:
+        print(f"读取 {target['key']} 的结果失败: {e}")
+        return False
+    finally:
+        os.unlink(result_file)
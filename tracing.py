@@ -0,0 +1,140 @@
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+
+# off: 不录制
+# failure: 轻量trace（只有操作和网络，不带截图和DOM快照），失败时另存出错时各页面的截图和HTML（默认）
+# full: 完整trace（每个操作都截图并保存DOM快照），只在失败时保存；开销明显，排查疑难问题时再打开
+# always: 完整trace，每次都保存
+TRACE_MODE = os.getenv("KEEPALIVE_TRACE", "failure")
+TRACE_DIR = Path(os.getenv("TRACE_DIR", "traces"))
+# 环形缓冲: 保存新记录后按时间从旧到新删除，直到总大小和数量都不超过上限
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_MAX_FILES = int(os.getenv("TRACE_MAX_FILES", "10"))
+
+# 上下文 -> 本次运行的失败记录目录，同一次运行中的多次失败和最后的trace写入同一个目录（环形缓冲中只占一条）
+_context_dirs = {}
+
+
+def _failure_dir(name) -> Path:
+    """新建一条失败记录的目录: traces/<时间>-<目标>/，同一秒内重名时加序号"""
+    label = re.sub(r"[^A-Za-z0-9._-]+", "_", re.sub(r"^\w+://", "", name)).strip("_")[-60:] or "run"
+    base = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}"
+    TRACE_DIR.mkdir(parents=True, exist_ok=True)
+    for attempt in range(1, 100):
+        path = TRACE_DIR / (base if attempt == 1 else f"{base}-{attempt}")
+        try:
+            path.mkdir()
+            return path
+        except FileExistsError:
+            continue
+    raise OSError(f"无法创建失败记录目录 {base}")
+
+
+def _context_failure_dir(context, name) -> Path:
+    """上下文本次运行的失败记录目录，第一次失败时创建"""
+    if context not in _context_dirs:
+        _context_dirs[context] = _failure_dir(name)
+    return _context_dirs[context]
+
+
+def start_tracing(context) -> bool:
+    """在上下文上开始录制trace，返回是否已开始；只有 full/always 模式才带截图和DOM快照"""
+    if TRACE_MODE == "off":
+        return False
+    full = TRACE_MODE in ("full", "always")
+    try:
+        context.tracing.start(screenshots=full, snapshots=full, sources=False)
+        return True
+    except Exception as e:
+        print(f"开始录制trace失败: {e}")
+        return False
+
+
+def _save_pages(pages, directory) -> None:
+    """保存各页面当前的截图和HTML，编号接在目录中已有的页面之后"""
+    index = len(list(directory.glob("page*.url")))
+    for page in pages:
+        if page.is_closed():
+            continue
+        index += 1
+        try:
+            (directory / f"page{index}.url").write_text(page.url, encoding="utf-8")
+            page.screenshot(path=str(directory / f"page{index}.png"), full_page=True, timeout=10000)
+            (directory / f"page{index}.html").write_text(page.content(), encoding="utf-8")
+        except Exception as e:
+            print(f"保存页面 {index} 的截图和HTML失败: {e}")
+
+
+def capture_failure(page, name) -> None:
+    """在出错的位置保存页面的截图和HTML（页面关闭之前调用），与结束录制时的trace写入同一目录"""
+    if TRACE_MODE == "off":
+        return
+    try:
+        directory = _context_failure_dir(page.context, name)
+    except OSError as e:
+        print(f"创建失败记录目录失败: {e}")
+        return
+    _save_pages([page], directory)
+    print(f"出错页面已保存到 {directory}")
+    prune_traces()
+
+
+def stop_tracing(context, failed, name) -> None:
+    """
+    结束录制：失败（或 always 模式）时把trace和仍打开的页面的截图、HTML写入环形缓冲目录，否则直接丢弃
+    不传path时Playwright不会打包trace
+    """
+    if TRACE_MODE == "off":
+        return
+    # 运行中已保存过出错页面时沿用同一目录
+    directory = _context_dirs.pop(context, None)
+    if not failed and TRACE_MODE != "always" and directory is None:
+        try:
+            context.tracing.stop()
+        except Exception as e:
+            print(f"结束录制trace失败: {e}")
+        return
+    try:
+        directory = directory or _failure_dir(name)
+    except OSError as e:
+        print(f"创建失败记录目录失败: {e}")
+        try:
+            context.tracing.stop()
+        except Exception:
+            pass
+        return
+    if failed:
+        _save_pages(context.pages, directory)
+    try:
+        context.tracing.stop(path=str(directory / "trace.zip"))
+        print(f"trace已保存到 {directory}，可用 `playwright show-trace {directory / 'trace.zip'}` 查看")
+    except Exception as e:
+        print(f"保存trace失败: {e}")
+    prune_traces()
+
+
+def _size(path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size
+
+
+def prune_traces(max_bytes=TRACE_MAX_BYTES, max_files=TRACE_MAX_FILES) -> None:
+    """删除最旧的记录，使目录总大小和记录数不超过上限（最新的一个总是保留）"""
+    records = sorted((p for p in TRACE_DIR.iterdir() if p.is_dir() or p.suffix == ".zip"),
+                     key=lambda p: p.stat().st_mtime)
+    total = sum(_size(p) for p in records)
+    while len(records) > 1 and (total > max_bytes or len(records) > max_files):
+        oldest = records.pop(0)
+        total -= _size(oldest)
+        try:
+            if oldest.is_dir():
+                shutil.rmtree(oldest)
+            else:
+                oldest.unlink()
+            print(f"删除旧trace {oldest.name}")
+        except OSError as e:
+            print(f"删除旧trace失败: {e}")
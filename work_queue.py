@@ -0,0 +1,216 @@
+"""
+基于租约的工作队列（SQLite），多个运行器从同一个队列领取目标，不会重复处理同一个工作区
+
+  enqueue  把目标列表（格式见 targets.py）加入队列；已完成或已失败的目标重新置为待处理
+  work     循环领取并执行目标，执行期间定时续租；--exit-when-empty 在队列处理完后退出
+  status   显示各目标的状态
+
+领取目标时获得一段时间的租约，执行期间每 1/3 租期续租一次；运行器崩溃或被取消后租约到期，
+目标由其他运行器重新领取。失败的目标延迟重试，超过 WORK_QUEUE_MAX_ATTEMPTS 次后标记为失败。
+队列数据库需放在所有运行器都能访问、且支持文件锁的位置（同一台机器或共享卷）。
+
+用法:
+  python work_queue.py enqueue targets.txt
+  python work_queue.py work [--worker-id ID] [--lease 秒] [--exit-when-empty]
+  python work_queue.py status
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from keepalive_state import STATE_DIR
+
+WORK_QUEUE_DB = os.getenv("WORK_QUEUE_DB", str(STATE_DIR / "work_queue.sqlite3"))
+LEASE_SECONDS = int(os.getenv("WORK_QUEUE_LEASE", "120"))
+MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+RETRY_DELAY = int(os.getenv("WORK_QUEUE_RETRY_DELAY", "60"))  # 第n次失败后延迟 n*RETRY_DELAY 秒重试
+POLL_INTERVAL = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',  -- pending / leased / done / failed
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    last_result TEXT,
+    updated_at REAL
+)
+"""
+
+
+def connect(path=None) -> sqlite3.Connection:
+    """打开队列数据库（自动提交模式，需要原子操作时显式 BEGIN IMMEDIATE）"""
+    path = path or WORK_QUEUE_DB
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # WAL 模式下读写互不阻塞，多个运行器同时领取时只在写入时短暂排队
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.execute(SCHEMA)
+    return conn
+
+
+def enqueue(conn, targets) -> int:
+    """加入目标，返回加入的数量；正在执行的目标保持原状态"""
+    now = time.time()
+    for target in targets:
+        conn.execute(
+            """INSERT INTO jobs (key, spec, updated_at) VALUES (?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET
+                 spec = excluded.spec,
+                 attempts = CASE WHEN state IN ('done', 'failed') THEN 0 ELSE attempts END,
+                 not_before = CASE WHEN state IN ('done', 'failed') THEN 0 ELSE not_before END,
+                 state = CASE WHEN state IN ('done', 'failed') THEN 'pending' ELSE state END,
+                 updated_at = excluded.updated_at""",
+            (target["key"], json.dumps(target), now))
+    return len(targets)
+
+
+def claim(conn, owner, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """领取一个待处理或租约已过期的目标，返回 (key, 目标)，没有可领取的目标时返回 None"""
+    # 时间用 time.time()：租约要在多个进程之间比较，不能用各进程独立的单调时钟
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # 租约过期且次数已用完的目标（运行器反复在这个目标上崩溃）不再重试
+        conn.execute("""UPDATE jobs SET state = 'failed', owner = NULL, last_result = 'lease expired', updated_at = ?
+                        WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?""", (now, now, max_attempts))
+        row = conn.execute("""SELECT key, spec FROM jobs
+                              WHERE (state = 'pending' AND not_before <= ?) OR (state = 'leased' AND lease_expires < ?)
+                              ORDER BY not_before, key LIMIT 1""", (now, now)).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("""UPDATE jobs SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1,
+                        updated_at = ? WHERE key = ?""", (owner, now + lease, now, row["key"]))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row["key"], json.loads(row["spec"])
+
+
+def heartbeat(conn, key, owner, lease=LEASE_SECONDS) -> bool:
+    """续租，返回租约是否仍属于 owner"""
+    now = time.time()
+    cursor = conn.execute("""UPDATE jobs SET lease_expires = ?, updated_at = ?
+                             WHERE key = ? AND owner = ? AND state = 'leased'""", (now + lease, now, key, owner))
+    return cursor.rowcount == 1
+
+
+def complete(conn, key, owner, success, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY) -> bool:
+    """记录执行结果，返回是否记录成功（租约已被其他运行器接管时不记录）"""
+    now = time.time()
+    if success:
+        cursor = conn.execute("""UPDATE jobs SET state = 'done', owner = NULL, last_result = 'ok', updated_at = ?
+                                 WHERE key = ? AND owner = ? AND state = 'leased'""", (now, key, owner))
+    else:
+        cursor = conn.execute(
+            """UPDATE jobs SET
+                 state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                 not_before = ? + attempts * ?,
+                 owner = NULL, last_result = 'failed', updated_at = ?
+               WHERE key = ? AND owner = ? AND state = 'leased'""",
+            (max_attempts, now, retry_delay, now, key, owner))
+    return cursor.rowcount == 1
+
+
+def status(conn) -> list:
+    return [dict(row) for row in conn.execute("SELECT * FROM jobs ORDER BY key")]
+
+
+def unfinished(conn) -> int:
+    """待处理和执行中的目标数"""
+    return conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('pending', 'leased')").fetchone()[0]
+
+
+def _keep_lease(key, owner, lease, stop, lost) -> None:
+    """后台续租线程（使用独立的数据库连接）"""
+    conn = connect()
+    try:
+        while not stop.wait(lease / 3):
+            try:
+                if not heartbeat(conn, key, owner, lease):
+                    print(f"[队列] {key} 的租约已被其他运行器接管，本次结果不会记录")
+                    lost.set()
+                    return
+            except sqlite3.Error as e:
+                print(f"[队列] 续租 {key} 失败: {e}")
+    finally:
+        conn.close()
+
+
+def work(owner, lease=LEASE_SECONDS, exit_when_empty=False, run_target=None) -> int:
+    """循环领取并执行目标，返回处理的目标数；run_target(目标) 返回是否成功"""
+    if run_target is None:
+        from targets import run_target
+    conn = connect()
+    processed = 0
+    try:
+        while True:
+            job = claim(conn, owner, lease)
+            if job is None:
+                if exit_when_empty and unfinished(conn) == 0:
+                    print(f"[队列] 队列已处理完，共处理 {processed} 个目标")
+                    return processed
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            key, target = job
+            print(f"[队列] {owner} 领取 {key}")
+            stop, lost = threading.Event(), threading.Event()
+            keeper = threading.Thread(target=_keep_lease, args=(key, owner, lease, stop, lost), daemon=True)
+            keeper.start()
+            success = False
+            try:
+                success = run_target(target)
+            except Exception as e:
+                print(f"[队列] 执行 {key} 时发生错误: {e}")
+            finally:
+                stop.set()
+                keeper.join()
+            processed += 1
+            if not lost.is_set() and complete(conn, key, owner, success):
+                print(f"[队列] {key} {'完成' if success else '失败'}")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于租约的工作队列")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue_parser = commands.add_parser("enqueue", help="把目标列表加入队列")
+    enqueue_parser.add_argument("targets", help="目标列表文件")
+    work_parser = commands.add_parser("work", help="领取并执行目标")
+    work_parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    work_parser.add_argument("--lease", type=int, default=LEASE_SECONDS, help="租期（秒）")
+    work_parser.add_argument("--exit-when-empty", action="store_true", help="队列处理完后退出")
+    commands.add_parser("status", help="显示各目标的状态")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        from targets import load_targets
+        conn = connect()
+        print(f"已加入 {enqueue(conn, load_targets(args.targets))} 个目标")
+        conn.close()
+    elif args.command == "work":
+        work(args.worker_id, args.lease, args.exit_when_empty)
+    else:
+        conn = connect()
+        now = time.time()
+        for job in status(conn):
+            detail = f"{job['owner']} 剩余租期 {job['lease_expires'] - now:.0f}秒" if job["state"] == "leased" else job["last_result"] or ""
+            print(f"{job['state']:<8} 第{job['attempts']}次  {job['key']}  {detail}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()